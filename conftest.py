@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def test_settings(django_test_environment):
+    """Те же тестовые настройки, что у manage.py test (core.testing)."""
+    from core.testing import TestSettings
+
+    overrides = TestSettings()
+    overrides.enable()
+    yield
+    overrides.disable()
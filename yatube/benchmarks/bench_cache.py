@@ -0,0 +1,79 @@
+"""SQLiteCache против LocMemCache и FileBasedCache.
+
+    python -m benchmarks.bench_cache [--ops 2000]
+
+Меряются типичные для лент операции: get фрагмента, set, incr счётчика
+поколения и get_many списков авторов.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from benchmarks.utils import measure, report
+
+
+FRAGMENT = '<article>' + 'x' * 4000 + '</article>'
+AUTHOR_KEYS = [f'feed:author:{i}' for i in range(100)]
+
+
+def bench_backend(name, backend, ops):
+    backend.set('fragment', FRAGMENT)
+    backend.set('generation', 1)
+    backend.set_many({key: {'count': 20, 'ids': [[1.0, 1]] * 20}
+                      for key in AUTHOR_KEYS})
+
+    def gets():
+        for _ in range(ops):
+            backend.get('fragment')
+
+    def sets():
+        for i in range(ops):
+            backend.set(f'key:{i % 100}', FRAGMENT)
+
+    def incrs():
+        for _ in range(ops):
+            backend.incr('generation')
+
+    def get_manys():
+        for _ in range(ops // 10):
+            backend.get_many(AUTHOR_KEYS)
+
+    return [
+        (f'{name}: {ops} get', measure(gets, repeat=3)),
+        (f'{name}: {ops} set', measure(sets, repeat=3)),
+        (f'{name}: {ops} incr', measure(incrs, repeat=3)),
+        (f'{name}: {ops // 10} get_many(100)', measure(get_manys, repeat=3)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from django.core.cache.backends.filebased import FileBasedCache
+    from django.core.cache.backends.locmem import LocMemCache
+
+    from core.cache_backend import SQLiteCache
+
+    tmp_dir = tempfile.mkdtemp()
+    backends = {
+        'LocMemCache': LocMemCache('bench', {}),
+        'FileBasedCache': FileBasedCache(os.path.join(tmp_dir, 'files'), {}),
+        'SQLiteCache': SQLiteCache(os.path.join(tmp_dir, 'c.sqlite3'), {}),
+    }
+    rows = []
+    try:
+        for name, backend in backends.items():
+            rows += bench_backend(name, backend, args.ops)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    report('Кеш-бэкенды', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Лента подписок: join против k-way слияния списков авторов.
+
+    python -m benchmarks.bench_follow_feed [--posts-per-author 20]
+
+Меряется первая страница ленты при 10, 100 и 1000 авторах в подписках;
+для 'merge' — с прогретым кешем списков авторов.
+"""
+import argparse
+
+from benchmarks.utils import make_posts, measure, report, setup_django
+
+
+FOLLOWING = (10, 100, 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts-per-author', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.core.paginator import Paginator
+
+    from posts.feeds import MergedFeed
+    from posts.models import Follow, Post
+
+    User = get_user_model()
+    authors, _ = make_posts(
+        max(FOLLOWING) * args.posts_per_author, authors=max(FOLLOWING)
+    )
+
+    def first_page(feed):
+        return lambda: list(
+            Paginator(feed(), settings.POSTS_PER_PAGE).get_page(1)
+        )
+
+    rows = []
+    for following in FOLLOWING:
+        reader = User.objects.create(username=f'reader_{following}')
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author)
+            for author in authors[:following]
+        )
+
+        def join():
+            return Post.objects.filter(author__following__user=reader)
+
+        def merge():
+            return MergedFeed(Follow.objects.filter(
+                user=reader
+            ).values_list('author_id', flat=True))
+
+        cache.clear()
+        first_page(merge)()
+        rows.append((f'join,  {following} авторов', measure(first_page(join))))
+        rows.append(
+            (f'merge, {following} авторов', measure(first_page(merge)))
+        )
+    report('Первая страница ленты подписок', rows)
+
+
+if __name__ == '__main__':
+    main()
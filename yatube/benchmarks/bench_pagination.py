@@ -0,0 +1,54 @@
+"""Сравнение нумерованной и курсорной пагинации главной ленты.
+
+    python -m benchmarks.bench_pagination [--posts 100000]
+
+Курсорная страница 10 000 должна стоить столько же, сколько первая.
+"""
+import argparse
+
+from benchmarks.utils import make_posts, measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100_000)
+    parser.add_argument('--per-page', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.paginator import Paginator
+
+    from posts.models import Post
+    from posts.paginators import FORWARD, CursorPaginator, encode_cursor
+
+    make_posts(args.posts, authors=50)
+    last_page = args.posts // args.per_page
+    queryset = Post.objects.all()
+
+    def offset_page(number):
+        return lambda: list(
+            Paginator(queryset, args.per_page).get_page(number)
+        )
+
+    # курсор, указывающий на начало последней страницы
+    anchor = queryset.order_by('-pub_date', '-pk')[
+        (last_page - 1) * args.per_page - 1
+    ]
+    deep_cursor = encode_cursor(FORWARD, anchor.pub_date, anchor.pk)
+
+    def cursor_page(cursor):
+        return lambda: list(
+            CursorPaginator(queryset, args.per_page).get_page(cursor)
+        )
+
+    report(f'{args.posts} постов, {args.per_page} на странице', [
+        ('Paginator, страница 1', measure(offset_page(1))),
+        (f'Paginator, страница {last_page}', measure(offset_page(last_page))),
+        ('CursorPaginator, страница 1', measure(cursor_page(None))),
+        (f'CursorPaginator, страница {last_page}',
+         measure(cursor_page(deep_cursor))),
+    ])
+
+
+if __name__ == '__main__':
+    main()
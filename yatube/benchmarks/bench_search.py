@@ -0,0 +1,80 @@
+"""Поиск по FTS5 против icontains (LIKE '%...%').
+
+    python -m benchmarks.bench_search [--posts 1000000]
+
+Тексты собираются из словаря случайных слов, так что в выдаче есть и
+частые, и редкие слова. icontains меряется так, как его использовала
+бы лента: первая страница по дате и COUNT(*) для пагинатора.
+"""
+import argparse
+import itertools
+import random
+
+from benchmarks.utils import make_posts, measure, report, setup_django
+
+
+LETTERS = 'абвгдежзиклмнопрстуфхцчшэюя'
+
+
+def vocabulary(size, rng):
+    return [
+        ''.join(rng.choice(LETTERS) for _ in range(rng.randint(4, 9)))
+        for _ in range(size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--words', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.paginator import Paginator
+
+    from posts.models import Post
+    from posts.search import SearchPaginator
+
+    rng = random.Random(0)
+    words = vocabulary(20_000, rng)
+    # распределение Ципфа: первые слова словаря встречаются часто
+    cum_weights = list(itertools.accumulate(
+        1 / rank for rank in range(1, len(words) + 1)
+    ))
+
+    def text(i):
+        return ' '.join(
+            rng.choices(words, cum_weights=cum_weights, k=args.words)
+        )
+
+    make_posts(args.posts, authors=100, text=text)
+    queries = {
+        'частое слово': words[0],
+        'редкое слово': words[-1],
+        'два слова': f'{words[1]} {words[50]}',
+    }
+    queryset = Post.objects.for_feed()
+    rows = []
+    for name, query in queries.items():
+        fts = SearchPaginator(queryset, query, args.per_page)
+        first = fts.get_page(None)
+        rows.append((f'FTS5, {name}: 1-я страница',
+                     measure(lambda: list(fts.get_page(None)))))
+        if first.has_next():
+            rows.append((f'FTS5, {name}: 2-я страница',
+                         measure(lambda: list(
+                             fts.get_page(first.next_cursor)))))
+        like = queryset.order_by('-pub_date', '-pk')
+        for word in query.split():
+            like = like.filter(text__icontains=word)
+        rows.append((f'icontains, {name}: 1-я страница',
+                     measure(lambda: list(like[:args.per_page]), repeat=3)))
+        rows.append((f'icontains, {name}: COUNT',
+                     measure(lambda: Paginator(like, args.per_page).count,
+                             repeat=3)))
+    report(f'Поиск по {args.posts} постам', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""EXPLAIN QUERY PLAN для запросов страниц ленты до и после индексов.
+
+    python -m benchmarks.explain_feeds [--index post_pub_date_id_idx ...]
+
+Запросы снимаются с настоящих представлений через тестовый клиент
+на полностью мигрированной схеме. Для «ДО» проверяемые индексы
+(по умолчанию из миграций 0012 и 0015) удаляются сырым SQL, для
+«ПОСЛЕ» создаются заново по сохранённым определениям. Строки плана
+с полным сканированием (SCAN без индекса) или временным B-деревом
+для сортировки помечаются «!!».
+"""
+import argparse
+
+from benchmarks.utils import make_posts, setup_django
+
+
+def suspicious(detail):
+    full_scan = detail.startswith('SCAN') and 'INDEX' not in detail
+    return full_scan or 'TEMP B-TREE' in detail
+
+
+INDEXES = (
+    'post_pub_date_id_idx',
+    'post_author_pub_date_idx',
+    'post_group_pub_date_idx',
+    'comment_post_pub_date_idx',
+)
+
+
+def capture_queries(urls, reader):
+    """{url: [SELECT ...]} — запросы страниц без сессии."""
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    client.force_login(reader)
+    queries = {}
+    for url in urls:
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            client.get(url)
+        queries[url] = [
+            query['sql'] for query in captured.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'django_session' not in query['sql']
+        ]
+    return queries
+
+
+def explain(queries):
+    from django.db import connection
+
+    for url, statements in queries.items():
+        print(f'\n{url}')
+        for sql in statements:
+            print(f'  {sql[:110]}')
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for *_, detail in cursor.fetchall():
+                    mark = '!!' if suspicious(detail) else '  '
+                    print(f'    {mark} {detail}')
+
+
+def drop_indexes(names):
+    """Удаляет индексы и возвращает их CREATE INDEX для восстановления."""
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index'"
+            f" AND name IN ({', '.join(['%s'] * len(names))})",
+            list(names),
+        )
+        definitions = dict(cursor.fetchall())
+        missing = set(names) - set(definitions)
+        if missing:
+            raise SystemExit(f'Нет индексов: {", ".join(sorted(missing))}')
+        for name in names:
+            cursor.execute(f'DROP INDEX "{name}"')
+    return [definitions[name] for name in names]
+
+
+def create_indexes(definitions):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        for sql in definitions:
+            cursor.execute(sql)
+        # планировщику нужна свежая статистика по новым индексам
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index', action='append', dest='indexes',
+                        help='индекс для сравнения; по умолчанию все из '
+                             '0012 и 0015')
+    args = parser.parse_args()
+
+    setup_django()
+    from posts import timeline
+    from posts.models import Comment, Follow, Post
+
+    authors, groups = make_posts(2000, authors=20, groups=5)
+    reader = authors[0]
+    Follow.objects.bulk_create(
+        Follow(user=reader, author=author) for author in authors[1:]
+    )
+    timeline.rebuild()
+    post = Post.objects.filter(author=authors[1]).first()
+    Comment.objects.bulk_create(
+        Comment(post=post, author=reader, text=f'Комментарий {i}')
+        for i in range(50)
+    )
+    urls = (
+        '/',
+        f'/group/{groups[0].slug}/',
+        f'/profile/{authors[1].username}/',
+        '/follow/',
+        f'/posts/{post.pk}/',
+    )
+    queries = capture_queries(urls, reader)
+    definitions = drop_indexes(args.indexes or INDEXES)
+    print('\n===== ДО =====')
+    explain(queries)
+    create_indexes(definitions)
+    print('\n===== ПОСЛЕ =====')
+    explain(queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Общие заготовки для бенчмарков.
+
+Бенчмарки запускаются из каталога yatube/:
+
+    python -m benchmarks.bench_pagination
+
+и работают с отдельной базой SQLite в памяти и временным кешем,
+не трогая db.sqlite3 и cache.sqlite3.
+"""
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+
+CHUNK_SIZE = 10_000
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    # отдельный файл кеша, чтобы не засорять рабочий cache.sqlite3
+    settings.CACHES['default']['LOCATION'] = os.path.join(
+        tempfile.mkdtemp(), 'cache.sqlite3'
+    )
+    settings.DEBUG = False
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def make_posts(count, authors=1, groups=0, text=None):
+    """Быстро создаёт count постов, равномерно по авторам и группам.
+
+    text(i) задаёт текст i-го поста, по умолчанию 'Пост i'.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.utils import timezone
+
+    from posts.models import Group, Post
+
+    User = get_user_model()
+    User.objects.bulk_create(
+        User(username=f'bench_{i}') for i in range(authors)
+    )
+    users = list(User.objects.filter(username__startswith='bench_'))
+    group_list = []
+    if groups:
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'bench-{i}', description='-')
+            for i in range(groups)
+        )
+        group_list = list(Group.objects.filter(slug__startswith='bench-'))
+    start = timezone.now() - timedelta(seconds=count)
+    text = text or (lambda i: f'Пост {i}')
+    # пачками, чтобы миллион объектов не держать в памяти разом
+    for chunk_start in range(0, count, CHUNK_SIZE):
+        Post.objects.bulk_create(
+            Post(
+                text=text(i),
+                author=users[i % len(users)],
+                group=group_list[i % len(group_list)] if group_list else None,
+            )
+            for i in range(chunk_start, min(chunk_start + CHUNK_SIZE, count))
+        )
+    # auto_now_add проставляет одинаковое время, разводим даты явно
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE posts_post SET pub_date = '
+            "datetime(%s, '+' || id || ' seconds')",
+            [start.strftime('%Y-%m-%d %H:%M:%S')],
+        )
+    return users, group_list
+
+
+def measure(func, repeat=5):
+    """Медиана времени выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def report(title, rows):
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    for name, value in rows:
+        print(f'  {name:<{width}}  {value:8.2f} ms')
@@ -0,0 +1,219 @@
+"""Общий для всех процессов кеш на SQLite.
+
+LocMemCache у каждого WSGI-воркера свой: промахи растут с числом
+воркеров, а сброс ключа в одном процессе не виден в остальных.
+SQLiteCache хранит записи в одном файле на машине (WAL, mmap), так что
+все воркеры видят один кеш, а incr/decr и add атомарны между процессами.
+
+Значения сериализуются в JSON, без pickle: поддерживаются строки,
+числа, bool, None, списки и словари; кортежи возвращаются списками.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backend.SQLiteCache',
+            'LOCATION': '/path/to/cache.sqlite3',
+        }
+    }
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value TEXT NOT NULL,'
+    ' expires REAL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+# Как часто (в операциях записи на процесс) чистить просроченные записи
+CULL_EVERY = 200
+MMAP_SIZE = 64 * 1024 * 1024
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(raw):
+    return json.loads(raw)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # после fork соединение родителя использовать нельзя
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, statements):
+        """Выполняет запросы одной транзакцией с блокировкой на запись."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            results = [connection.execute(sql, params).rowcount
+                       for sql, params in statements]
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self._cull()
+        return results
+
+    def _cull(self):
+        now = time.time()
+        self.connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (now,)
+        )
+        (count,) = self.connection.execute(
+            'SELECT COUNT(*) FROM cache'
+        ).fetchone()
+        if count > self._max_entries:
+            self.connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache'
+                ' ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        row = self.connection.execute(
+            f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return default if row is None else loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        rows = self.connection.execute(
+            f'SELECT key, value FROM cache '
+            f'WHERE key IN ({placeholders}) AND {ALIVE}',
+            (*keys, time.time()),
+        )
+        found = {key: loads(value) for key, value in rows}
+        # порядок как у запрошенных ключей, как в остальных бэкендах
+        return {
+            original: found[key]
+            for key, original in keys.items() if key in found
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([self._set_statement(key, value, timeout, version)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if data:
+            self._write([
+                self._set_statement(key, value, timeout, version)
+                for key, value in data.items()
+            ])
+        return []
+
+    def _set_statement(self, key, value, timeout, version):
+        return (
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (self._key(key, version), dumps(value),
+             self.get_backend_timeout(timeout)),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        _, inserted = self._write([
+            ('DELETE FROM cache WHERE key = ? AND expires <= ?',
+             (key, time.time())),
+            ('INSERT OR IGNORE INTO cache (key, value, expires) '
+             'VALUES (?, ?, ?)',
+             (key, dumps(value), self.get_backend_timeout(timeout))),
+        ])
+        return bool(inserted)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        (updated,) = self._write([(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        )])
+        return bool(updated)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (dumps(value), key),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def delete(self, key, version=None):
+        self._write([
+            ('DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+        ])
+
+    def delete_many(self, keys, version=None):
+        statements = [
+            ('DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+            for key in keys
+        ]
+        if statements:
+            self._write(statements)
+
+    def has_key(self, key, version=None):
+        return self.connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def clear(self):
+        self._write([('DELETE FROM cache', ())])
+
+    def close(self, **kwargs):
+        # соединение держится на поток и переживает запрос
+        pass
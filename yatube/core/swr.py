@@ -0,0 +1,90 @@
+"""Кеширование stale-while-revalidate с пересчётом в один поток.
+
+Запись хранится вместе с моментом, до которого она свежая (мягкий TTL),
+и версией, а в кеше живёт до жёсткого TTL. Запись устарела, если истёк
+мягкий TTL или сменилась версия (например, поколение ленты): тогда
+пересчитывает только тот запрос, который первым взял замок в кеше
+(cache.add), а остальные в это время получают устаревшую копию
+и не идут в базу.
+
+Если копии нет совсем, замок тоже берёт один запрос; остальные
+ждут его результата до LOCK_TIMEOUT и лишь потом считают сами.
+
+Копия другой версии расходится с ETag, посчитанным по новой версии,
+поэтому тег swrcache помечает такой запрос (mark_stale), и
+posts.conditional не отдаёт для него валидаторы.
+"""
+import time
+
+from django.core.cache import cache as default_cache
+
+
+LOCK_TIMEOUT = 30
+LOCK_KEY = '{}:lock'
+# Как часто проигравшие замок проверяют, не появилась ли запись
+WAIT_INTERVAL = 0.05
+
+
+def get_or_compute(key, compute, soft_timeout, hard_timeout, version=None,
+                   cache=default_cache, on_stale=None):
+    """Значение по key; on_stale() зовётся, если отдана копия другой
+    версии (её считает другой запрос)."""
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until, entry_version = entry
+        if time.time() < fresh_until and entry_version == version:
+            return value
+        lock_key = LOCK_KEY.format(key)
+        if not cache.add(lock_key, True, LOCK_TIMEOUT):
+            return _stale(entry, version, on_stale)
+        try:
+            return _store(key, compute, soft_timeout, hard_timeout,
+                          version, cache)
+        finally:
+            cache.delete(lock_key)
+    return _compute_missing(key, compute, soft_timeout, hard_timeout,
+                            version, cache, on_stale)
+
+
+def _stale(entry, version, on_stale):
+    value, _, entry_version = entry
+    if entry_version != version and on_stale is not None:
+        on_stale()
+    return value
+
+
+def _compute_missing(key, compute, soft_timeout, hard_timeout, version,
+                     cache, on_stale):
+    lock_key = LOCK_KEY.format(key)
+    deadline = time.time() + LOCK_TIMEOUT
+    while not cache.add(lock_key, True, LOCK_TIMEOUT):
+        # запись считает другой запрос — ждём её, а не считаем вместе с ним
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return _stale(entry, version, on_stale)
+        if time.time() >= deadline:
+            return _store(key, compute, soft_timeout, hard_timeout,
+                          version, cache)
+    try:
+        return _store(key, compute, soft_timeout, hard_timeout, version,
+                      cache)
+    finally:
+        cache.delete(lock_key)
+
+
+def mark_stale(request):
+    request._swr_stale = True
+
+
+def served_stale(request):
+    """Отдавал ли запрос копию другой версии (см. get_or_compute)."""
+    return getattr(request, '_swr_stale', False)
+
+
+def _store(key, compute, soft_timeout, hard_timeout, version, cache):
+    value = compute()
+    cache.set(
+        key, (value, time.time() + soft_timeout, version), hard_timeout
+    )
+    return value
@@ -0,0 +1,37 @@
+from django import template
+
+
+register = template.Library()
+
+# Маркер пропущенных страниц в результате page_window
+ELLIPSIS = None
+
+
+def elided_page_range(num_pages, number, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, разрывы — ELLIPSIS.
+
+    Короткие списки (до (on_each_side + on_ends) * 2 + 1 страниц)
+    возвращаются целиком, как раньше.
+    """
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        yield from range(1, num_pages + 1)
+        return
+    if number > 1 + on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2, on_ends=1):
+    return list(elided_page_range(
+        page_obj.paginator.num_pages, page_obj.number, on_each_side, on_ends
+    ))
@@ -0,0 +1,65 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.swr import get_or_compute, mark_stale
+
+
+register = template.Library()
+
+
+class SWRCacheNode(template.Node):
+    def __init__(self, nodelist, soft_timeout, hard_timeout,
+                 fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.soft_timeout = soft_timeout
+        self.hard_timeout = hard_timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on]
+        )
+        request = context.get('request')
+        return get_or_compute(
+            key,
+            lambda: self.nodelist.render(context),
+            int(self.soft_timeout.resolve(context)),
+            int(self.hard_timeout.resolve(context)),
+            version=(
+                None if self.version is None
+                else self.version.resolve(context)
+            ),
+            on_stale=None if request is None else lambda: mark_stale(request),
+        )
+
+
+@register.tag
+def swrcache(parser, token):
+    """Как {% cache %}, но с мягким и жёстким TTL (см. core.swr).
+
+        {% swrcache soft_timeout hard_timeout fragment_name [var ...]
+                    [version=expr] %}
+
+    version не входит в ключ: при его смене фрагмент считается
+    устаревшим, и его пересчитывает один запрос, а не все сразу.
+    """
+    nodelist = parser.parse(('endswrcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    version = None
+    if tokens[-1].startswith('version='):
+        version = parser.compile_filter(tokens.pop()[len('version='):])
+    if len(tokens) < 4:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 3 arguments.'
+        )
+    return SWRCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        parser.compile_filter(tokens[2]),
+        tokens[3],
+        [parser.compile_filter(token) for token in tokens[4:]],
+        version,
+    )
@@ -0,0 +1,50 @@
+"""Настройки тестового прогона.
+
+Тесты идут на том же кеш-бэкенде, что и сайт (SQLiteCache), но с
+отдельным временным файлом, чтобы не видеть записи прошлых прогонов
+и не стирать кеш разработчика. Фоновые пулы миниатюр и проверки
+картинок отключены: тестам нужен результат сразу, в том же процессе.
+
+manage.py test берёт TestRunner из TEST_RUNNER, pytest — фикстуру
+из conftest.py в корне репозитория.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestSettings:
+    """override_settings на весь прогон с временным файлом кеша."""
+
+    def enable(self):
+        self.directory = tempfile.mkdtemp(prefix='yatube-test-cache-')
+        caches = copy.deepcopy(settings.CACHES)
+        caches['default']['LOCATION'] = os.path.join(
+            self.directory, 'cache.sqlite3'
+        )
+        self.override = override_settings(
+            CACHES=caches,
+            THUMBNAIL_WORKERS=0,
+            IMAGE_VALIDATION_WORKERS=0,
+        )
+        self.override.enable()
+
+    def disable(self):
+        self.override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = TestSettings()
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
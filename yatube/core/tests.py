@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from .cache_backend import SQLiteCache
+from .swr import get_or_compute
+
+
+def incr_many(location, times):
+    backend = SQLiteCache(location, {})
+    for _ in range(times):
+        backend.incr('counter')
+
+
+class StaleWhileRevalidateTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fresh_value_is_not_recomputed(self):
+        compute = mock.Mock(return_value='свежее')
+        get_or_compute('swr-test', compute, 60, 600)
+        self.assertEqual(get_or_compute('swr-test', compute, 60, 600),
+                         'свежее')
+        compute.assert_called_once()
+
+    def race(self, version=None, threads=10):
+        """Запускает threads одновременных get_or_compute;
+        возвращает (число пересчётов, результаты)."""
+        calls = []
+        started = threading.Barrier(threads)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'новое'
+
+        results = []
+
+        def worker():
+            started.wait()
+            results.append(get_or_compute(
+                'swr-test', compute, 60, 600, version=version
+            ))
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return len(calls), results
+
+    def test_single_recomputation_per_expiry(self):
+        """После мягкого TTL пересчитывает ровно один поток,
+        остальные получают устаревшую копию."""
+        cache.set('swr-test', ('старое', time.time() - 1, None), 600)
+        calls, results = self.race()
+        self.assertEqual(calls, 1)
+        self.assertEqual(results.count('новое'), 1)
+        self.assertEqual(results.count('старое'), 9)
+        compute = mock.Mock(return_value='лишнее')
+        self.assertEqual(get_or_compute('swr-test', compute, 60, 600),
+                         'новое')
+        compute.assert_not_called()
+
+    def test_new_version_is_recomputed_once(self):
+        """Смена версии — как истёкший мягкий TTL, а не промах."""
+        cache.set('swr-test', ('старое', time.time() + 60, 1), 600)
+        calls, results = self.race(version=2)
+        self.assertEqual(calls, 1)
+        self.assertEqual(results.count('старое'), 9)
+        compute = mock.Mock(return_value='лишнее')
+        self.assertEqual(
+            get_or_compute('swr-test', compute, 60, 600, version=2), 'новое'
+        )
+        compute.assert_not_called()
+
+    def test_single_computation_on_miss(self):
+        """Без копии считает один поток, остальные ждут его результат."""
+        calls, results = self.race()
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, ['новое'] * 10)
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.location = os.path.join(self.tmp_dir, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_basic_operations(self):
+        self.cache.set('a', {'ids': [(1.5, 2)], 'count': 1})
+        self.assertEqual(self.cache.get('a'), {'ids': [[1.5, 2]], 'count': 1})
+        self.assertFalse(self.cache.add('a', 'другое'))
+        self.assertTrue(self.cache.add('b', 'текст'))
+        self.assertEqual(
+            self.cache.get_many(['b', 'a', 'нет']),
+            {'b': 'текст', 'a': {'ids': [[1.5, 2]], 'count': 1}},
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_expired_entry_is_missing(self):
+        self.cache.set('a', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.add('a', 2))
+        self.assertEqual(self.cache.get('a'), 2)
+
+    def test_incr(self):
+        self.cache.set('n', 1)
+        self.assertEqual(self.cache.incr('n', 5), 6)
+        self.assertEqual(self.cache.decr('n'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('нет')
+
+    def test_incr_is_atomic_across_processes(self):
+        """Воркеры в разных процессах видят один счётчик."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=incr_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
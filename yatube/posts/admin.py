@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
 from .models import Post, Group
+from . import search
 
 
 @admin.register(Post)
@@ -11,5 +13,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # тот же индекс FTS5, что и у /search/, вместо LIKE '%...%'
+        match = search.match_expression(search_term)
+        if not match or not search.enabled():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(
+            pk__in=RawSQL(search.matching_ids_sql(), [match])
+        ), False
+
 
 admin.site.register(Group)
@@ -1,5 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search(sender, using, **kwargs):
+    # SQLite пересоздаёт posts_post при части миграций вместе с триггерами
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+
+    from . import search
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ('posts', '0016_post_search') in applied:
+        search.install(connection)
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search, sender=self)
@@ -0,0 +1,140 @@
+"""Условные GET (ETag/Last-Modified) для лент и страницы поста.
+
+Валидаторы строятся только из поколений (posts.generations) и одного
+запроса по первичному или уникальному ключу, так что 304 отдаётся
+до выборки постов, COUNT и рендеринга шаблона. В ETag входит и
+зритель: от него зависят шапка, кнопка подписки и лента /follow/.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.http import Http404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from core.swr import served_stale
+
+from . import follows
+from .generations import get_generations, last_modified
+from .models import Group, Post
+
+
+User = get_user_model()
+
+# Общие с views выборки: объект, найденный для валидаторов, view берёт
+# из памяти запроса, а не читает из базы второй раз.
+GROUPS = Group.objects.all()
+AUTHORS = User.objects.select_related('counters')
+POSTS = Post.objects.select_related('author__counters', 'group')
+
+
+def lookup(request, queryset, **kwargs):
+    """Объект по уникальному ключу или None, один запрос на request."""
+    lookups = request.__dict__.setdefault('_conditional_lookups', {})
+    key = (queryset.model, tuple(sorted(kwargs.items())))
+    if key not in lookups:
+        lookups[key] = queryset.filter(**kwargs).first()
+    return lookups[key]
+
+
+def get_object_or_404(request, queryset, **kwargs):
+    obj = lookup(request, queryset, **kwargs)
+    if obj is None:
+        raise Http404(f'No {queryset.model._meta.object_name} matches '
+                      f'the given query.')
+    return obj
+
+
+def index_scopes(request):
+    return [('index', None)]
+
+
+def group_scopes(request, slug):
+    group = lookup(request, GROUPS, slug=slug)
+    return None if group is None else [('group', group.pk)]
+
+
+def profile_scopes(request, username):
+    author = lookup(request, AUTHORS, username=username)
+    if author is None:
+        return None
+    # ('follower', pk) — профиль показывает и число подписок автора
+    return [
+        ('author', author.pk), ('followers', author.pk),
+        ('follower', author.pk), ('suggestions', None),
+    ]
+
+
+def post_scopes(request, post_id):
+    post = lookup(request, POSTS, id=post_id)
+    if post is None:
+        return None
+    # на странице поста есть счётчик постов автора
+    return [('post', post.pk), ('author', post.author_id)]
+
+
+def follow_scopes(request):
+    # лента меняется с постами авторов, на которых подписан зритель,
+    # а сами подписки — ('follower', pk) — добавляются в _scopes
+    return [('suggestions', None)] + [
+        ('author', author_id)
+        for author_id in follows.following_ids(request.user.pk)
+    ]
+
+
+def _scopes(request, scopes_func, args, kwargs):
+    # etag_func и last_modified_func зовутся по очереди — считаем один раз
+    if not hasattr(request, '_conditional_scopes'):
+        scopes = scopes_func(request, *args, **kwargs)
+        if scopes is not None and request.user.is_authenticated:
+            scopes = [*scopes, ('follower', request.user.pk)]
+        request._conditional_scopes = scopes
+    return request._conditional_scopes
+
+
+def conditional(scopes_func):
+    """Декоратор view: ETag и Last-Modified по областям scopes_func.
+
+    scopes_func(request, *args, **kwargs) возвращает список (scope, pk)
+    или None, если объекта нет — тогда view сам ответит 404.
+    """
+    def etag(request, *args, **kwargs):
+        scopes = _scopes(request, scopes_func, args, kwargs)
+        if scopes is None:
+            return None
+        parts = [str(request.user.pk or 0)] + [
+            f'{scope}:{pk}:{generation}'
+            for (scope, pk), generation in zip(
+                scopes, get_generations(scopes)
+            )
+        ]
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def modified(request, *args, **kwargs):
+        scopes = _scopes(request, scopes_func, args, kwargs)
+        if not scopes:
+            return None
+        timestamp = last_modified(scopes)
+        if timestamp is None:
+            return None
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=modified
+        )(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if served_stale(request):
+                # валидаторы посчитаны по новому поколению, а во фрагменте
+                # старое — иначе клиент получал бы 304 на старую страницу
+                del response['ETag']
+                del response['Last-Modified']
+            return response
+        # браузер хранит страницу, но перепроверяет её на каждом заходе
+        return cache_control(private=True, no_cache=True)(inner)
+    return decorator
@@ -0,0 +1,73 @@
+"""Денормализованные счётчики постов, комментариев и подписок."""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, UserCounters
+
+
+User = get_user_model()
+
+
+def bump_user(user_id, field, delta):
+    UserCounters.objects.filter(user_id=user_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+
+
+def count_of(model, field):
+    """Подзапрос COUNT(*) по model.field = внешний pk (0, если строк нет)."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def repair():
+    """Создаёт недостающие счётчики и исправляет разошедшиеся.
+
+    Возвращает пару (исправлено счётчиков пользователей, постов).
+    """
+    UserCounters.objects.bulk_create(
+        UserCounters(user_id=user_id)
+        for user_id in User.objects.filter(
+            counters__isnull=True
+        ).values_list('pk', flat=True)
+    )
+    users = UserCounters.objects.annotate(
+        actual_posts=count_of(Post, 'author'),
+        actual_followers=count_of(Follow, 'author'),
+        actual_following=count_of(Follow, 'user'),
+    ).exclude(
+        posts_count=F('actual_posts'),
+        followers_count=F('actual_followers'),
+        following_count=F('actual_following'),
+    )
+    fixed_users = 0
+    for row in users.iterator():
+        UserCounters.objects.filter(pk=row.pk).update(
+            posts_count=row.actual_posts,
+            followers_count=row.actual_followers,
+            following_count=row.actual_following,
+        )
+        fixed_users += 1
+    posts = Post.objects.annotate(
+        actual_comments=count_of(Comment, 'post')
+    ).exclude(comments_count=F('actual_comments'))
+    fixed_posts = 0
+    for pk, actual in posts.values_list('pk', 'actual_comments').iterator():
+        Post.objects.filter(pk=pk).update(comments_count=actual)
+        fixed_posts += 1
+    return fixed_users, fixed_posts
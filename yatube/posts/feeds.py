@@ -0,0 +1,129 @@
+"""Стратегии построения ленты подписок.
+
+settings.FOLLOW_FEED_STRATEGY выбирает одну из них:
+
+* 'join' — выборка постов по кешированному списку подписок
+  (posts.follows), для очень длинных списков — соединение с Follow;
+* 'timeline' — материализованная лента, см. posts.timeline;
+* 'merge' — k-way слияние кешированных списков свежих постов авторов.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import follows, timeline
+from .models import Post
+
+
+AUTHOR_KEY = 'feed:author:{}'
+
+
+def author_key(author_id):
+    return AUTHOR_KEY.format(author_id)
+
+
+def load_author_entries(author_ids):
+    """Кешированные списки (timestamp, post_id) по убыванию для авторов.
+
+    Возвращает словарь author_id -> {'count': всего постов, 'ids': [...]},
+    промахи кеша дочитываются из базы и сохраняются. Элементы ids всегда
+    кортежи: кеш с JSON возвращает их списками, а heapq.merge не умеет
+    сравнивать список с кортежем.
+    """
+    keys = {author_key(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    entries = {
+        keys[key]: {
+            'count': value['count'],
+            'ids': [tuple(item) for item in value['ids']],
+        }
+        for key, value in cached.items()
+    }
+    size = settings.FEED_AUTHOR_CACHE_SIZE
+    missing = {}
+    for author_id in set(author_ids) - set(entries):
+        posts = Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-pk'
+        )
+        recent = [
+            (pub_date.timestamp(), post_id)
+            for post_id, pub_date in posts.values_list('id', 'pub_date')[
+                :size
+            ]
+        ]
+        count = len(recent) if len(recent) < size else posts.count()
+        missing[author_key(author_id)] = {'count': count, 'ids': recent}
+        entries[author_id] = missing[author_key(author_id)]
+    if missing:
+        cache.set_many(missing, settings.FEED_AUTHOR_CACHE_TIMEOUT)
+    return entries
+
+
+def invalidate_author(author_id):
+    cache.delete(author_key(author_id))
+
+
+class MergedFeed:
+    """Лента подписок, собираемая слиянием списков авторов через heapq.
+
+    Поддерживает len() и срезы, поэтому подходит для Paginator. Пока
+    срез укладывается в FEED_AUTHOR_CACHE_SIZE, к Follow и Post не
+    выполняется ни одного соединения: слияние идёт в памяти, а сами
+    посты читаются по первичному ключу.
+    """
+
+    def __init__(self, author_ids):
+        self.author_ids = list(author_ids)
+        self._entries = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = load_author_entries(self.author_ids)
+        return self._entries
+
+    @property
+    def queryset(self):
+        return Post.objects.for_feed().filter(author_id__in=self.author_ids)
+
+    def count(self):
+        return sum(entry['count'] for entry in self.entries.values())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None or stop > settings.FEED_AUTHOR_CACHE_SIZE:
+            return list(self.queryset.order_by('-pub_date', '-pk')[index])
+        merged = heapq.merge(
+            *(entry['ids'] for entry in self.entries.values()),
+            reverse=True,
+        )
+        post_ids = [post_id for _, post_id in islice(merged, start, stop)]
+        posts = Post.objects.for_feed().in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def follow_feed(user):
+    strategy = settings.FOLLOW_FEED_STRATEGY
+    if strategy == 'timeline':
+        return timeline.feed(user)
+    # подписки берутся из кеша (posts.follows), а не соединением с Follow
+    author_ids = follows.following_ids(user.pk)
+    if strategy == 'merge':
+        feed = MergedFeed(author_ids)
+        if settings.POSTS_PAGINATION == 'cursor':
+            # курсору нужен QuerySet; IN по авторам обходится без join
+            return feed.queryset
+        return feed
+    if not author_ids:
+        return Post.objects.none()
+    if len(author_ids) > settings.FOLLOWING_IN_LIMIT:
+        # слишком длинный IN хуже соединения (и упирается в лимит СУБД)
+        return Post.objects.for_feed().filter(author__following__user=user)
+    return Post.objects.for_feed().filter(author_id__in=author_ids)
@@ -0,0 +1,76 @@
+"""Подписки: идемпотентные подписка и отписка, кеш графа подписок.
+
+INSERT идёт без предварительного SELECT: повтор (двойной клик, две
+вкладки) упирается в unique_follow и ничего не меняет. Сигналы
+posts.signals срабатывают только для реально добавленной строки.
+
+following_ids(user_id) — отсортированный массив id авторов, на которых
+подписан пользователь. Он читается из базы один раз и живёт в кеше под
+поколением 'following' этого пользователя. Его сдвигают только подписка
+и отписка (signals.py), а не новые посты авторов, так что отдельно
+сбрасывать ключ не нужно.
+Из него берут кнопку подписки в профиле, ленты подписок и рекомендации.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .generations import get_generation
+from .models import Follow, UserCounters
+
+
+FOLLOWING_KEY = 'following:{}:{}'
+
+
+def follow(user, author):
+    """Подписывает user на author; True, если подписки ещё не было."""
+    if user.pk == author.pk:
+        return False
+    try:
+        # точка сохранения: конфликт не ломает внешнюю транзакцию
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author):
+    """Отписывает user от author; True, если подписка была."""
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
+
+
+def followers_count(author):
+    return UserCounters.objects.filter(user=author).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def following_key(user_id):
+    return FOLLOWING_KEY.format(user_id, get_generation('following', user_id))
+
+
+def following_ids(user_id):
+    """array('q') id авторов, на которых подписан user_id, по возрастанию."""
+    key = following_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(Follow.objects.filter(user_id=user_id).order_by(
+            'author_id'
+        ).values_list('author_id', flat=True))
+        cache.set(key, ids, settings.FOLLOWING_CACHE_TIMEOUT)
+    return array('q', ids)
+
+
+def contains(ids, author_id):
+    """Двоичный поиск author_id в отсортированном массиве ids."""
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def is_following(user_id, author_id):
+    return contains(following_ids(user_id), author_id)
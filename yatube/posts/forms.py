@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import verify_upload
 from .models import Post, Comment
 
 
@@ -8,6 +10,19 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        # отказы BoundedUploadHandler: такой файл до формы не доходит
+        self.upload_errors = upload_errors or {}
+        super().__init__(*args, **kwargs)
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(self.upload_errors['image'])
+        if isinstance(image, UploadedFile):
+            verify_upload(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
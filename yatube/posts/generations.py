@@ -0,0 +1,87 @@
+"""Счётчики поколений для версионированных ключей кеша.
+
+Каждая лента ('index', 'group', 'author') и пост ('post') имеют своё
+поколение. Остальные области:
+
+* 'follower' — подписки пользователя для ETag его страниц; посты
+  авторов по подписчикам не расходятся, /follow/ сверяется
+  с поколениями 'author' (posts.conditional);
+* 'following' — ключ кеша его списка подписок (posts.follows);
+* 'followers' — подписки на автора;
+* 'suggestions' — пересчёт рекомендаций (posts.suggestions).
+
+'follower' и 'following' сдвигаются только при подписке и отписке.
+Поколение хранится вместе с фрагментом как версия (core.swr), поэтому
+фрагменты могут жить часами: изменение контента сдвигает поколение
+(signals.py), и фрагмент пересчитывается.
+
+Вместе с поколением запоминается время изменения: по нему views
+отдают Last-Modified (posts.conditional).
+"""
+import time
+
+from django.core.cache import cache
+
+
+GENERATION_KEY = 'generation:{}'
+MODIFIED_KEY = 'modified:{}'
+
+
+def generation_key(scope, pk=None):
+    return GENERATION_KEY.format(scope if pk is None else f'{scope}:{pk}')
+
+
+def modified_key(scope, pk=None):
+    return MODIFIED_KEY.format(scope if pk is None else f'{scope}:{pk}')
+
+
+def initial():
+    # Пропавшее из кеша поколение начинается с текущего времени, а не
+    # с 1, чтобы не совпасть с ключами фрагментов, сохранённых раньше.
+    return int(time.time() * 1000)
+
+
+def get_generation(scope, pk=None):
+    key = generation_key(scope, pk)
+    value = cache.get(key)
+    if value is None:
+        value = initial()
+        if cache.add(key, value, None):
+            cache.set(modified_key(scope, pk), time.time(), None)
+        else:
+            value = cache.get(key, value)
+    return value
+
+
+def get_generations(scopes):
+    """Поколения для списка (scope, pk) одним get_many."""
+    keys = [generation_key(scope, pk) for scope, pk in scopes]
+    values = cache.get_many(keys)
+    return [
+        values[key] if key in values else get_generation(scope, pk)
+        for key, (scope, pk) in zip(keys, scopes)
+    ]
+
+
+def bump(scope, pk=None):
+    key = generation_key(scope, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, initial(), None)
+    cache.set(modified_key(scope, pk), time.time(), None)
+
+
+def last_modified(scopes):
+    """Время последнего изменения (timestamp) по списку (scope, pk).
+
+    None, если хоть для одной области время неизвестно: тогда
+    Last-Modified лучше не отдавать вовсе, чем отдать слишком ранний.
+    """
+    keys = [modified_key(scope, pk) for scope, pk in scopes]
+    if not keys:
+        return None
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        return None
+    return max(values.values())
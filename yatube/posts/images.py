@@ -0,0 +1,160 @@
+"""Метаданные картинок постов: размеры, вес и хеш содержимого.
+
+Считаются один раз при загрузке (signals.py) или командой
+backfill_image_metadata, чтобы шаблонам и миниатюрам не открывать файл.
+
+Здесь же полная проверка загрузки (verify_upload): картинка целиком
+декодируется в отдельном процессе, так что «бомба» или битый файл
+не занимают память и GIL воркера, а падение декодера не роняет его.
+"""
+import hashlib
+import io
+import multiprocessing
+import threading
+import warnings
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.images import get_image_dimensions
+from PIL import Image
+
+from .storage import remember_hash
+from .uploads import too_many_pixels_message
+
+
+INVALID_IMAGE = 'Файл повреждён или это не картинка.'
+VERIFY_TIMEOUT_MESSAGE = 'Картинку не удалось проверить, попробуйте другую.'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def read_metadata(file):
+    """Размеры по заголовку картинки, размер и sha256 по кускам файла."""
+    width, height = get_image_dimensions(file)
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_hash': digest.hexdigest(),
+    }
+
+
+def empty_metadata():
+    return {
+        'image_width': None,
+        'image_height': None,
+        'image_size': None,
+        'image_hash': '',
+    }
+
+
+def update_metadata(post):
+    """Заполняет поля поста, если картинку только что загрузили или убрали."""
+    if not post.image:
+        metadata = empty_metadata()
+    elif not post.image._committed:
+        metadata = read_metadata(post.image)
+        # тот же хеш нужен хранилищу для имени файла
+        remember_hash(post.image.file, metadata['image_hash'])
+    else:
+        return
+    for field, value in metadata.items():
+        setattr(post, field, value)
+
+
+def verify(source, max_pixels):
+    """Декодирует картинку целиком: None, 'pixels' или 'invalid'.
+
+    Выполняется в процессе пула, поэтому получает путь к временному
+    файлу или байты загрузки и не трогает настройки Django.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(source) as image:
+                width, height = image.size
+                if width * height > max_pixels:
+                    return 'pixels'
+                image.load()
+    except Image.DecompressionBombError:
+        return 'pixels'
+    except Exception:
+        return 'invalid'
+    return None
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: дочерним процессам не достаются соединения с базой
+            # и потоки воркера
+            _executor = futures.ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VALIDATION_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _executor
+
+
+def discard_executor(pool, kill=False):
+    """Убирает пул, чтобы следующая проверка создала новый.
+
+    kill снимает и процессы пула: future.cancel() не прерывает уже
+    идущее декодирование, и зависшая картинка держала бы процесс.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+    if kill:
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False)
+
+
+def run_verify(source):
+    max_pixels = settings.POST_IMAGE_MAX_PIXELS
+    if not settings.IMAGE_VALIDATION_WORKERS:
+        return verify(source, max_pixels)
+    for _ in range(2):
+        pool = executor()
+        try:
+            future = pool.submit(verify, source, max_pixels)
+            return future.result(timeout=settings.IMAGE_VALIDATION_TIMEOUT)
+        except futures.TimeoutError:
+            discard_executor(pool, kill=True)
+            return 'timeout'
+        except (BrokenProcessPool, RuntimeError):
+            # процесс упал на этой или соседней картинке либо пул снят
+            # по таймауту другой проверки — повторяем один раз в новом
+            discard_executor(pool)
+    return 'invalid'
+
+
+def verify_upload(file):
+    """Полная проверка загруженного файла, ValidationError при ошибке."""
+    if hasattr(file, 'temporary_file_path'):
+        source = file.temporary_file_path()
+    else:
+        file.seek(0)
+        source = file.read()
+        file.seek(0)
+    error = run_verify(source)
+    if error == 'pixels':
+        raise ValidationError(too_many_pixels_message())
+    if error == 'timeout':
+        raise ValidationError(VERIFY_TIMEOUT_MESSAGE)
+    if error:
+        raise ValidationError(INVALID_IMAGE)
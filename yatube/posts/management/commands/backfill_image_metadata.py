@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import images
+from posts.models import Post
+
+
+FIELDS = ('image_width', 'image_height', 'image_size', 'image_hash')
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры, вес и хеш картинок у старых постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='сколько постов читать и сохранять за раз',
+        )
+
+    def handle(self, *args, **options):
+        pending = Post.objects.exclude(image='').filter(
+            image_hash=''
+        ).only('pk', 'image').order_by('pk')
+        last_pk = 0
+        filled = missing = 0
+        while True:
+            chunk = list(
+                pending.filter(pk__gt=last_pk)[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            ready = []
+            for post in chunk:
+                try:
+                    with post.image.open('rb'):
+                        metadata = images.read_metadata(post.image)
+                except (OSError, ValueError):
+                    missing += 1
+                    continue
+                for field, value in metadata.items():
+                    setattr(post, field, value)
+                ready.append(post)
+            # bulk_update без сигналов: поколения лент не сдвигаются
+            with transaction.atomic():
+                Post.objects.bulk_update(ready, FIELDS)
+            filled += len(ready)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено картинок: {filled}, не удалось прочитать: {missing}'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «кого почитать» по графу подписок'
+
+    def handle(self, *args, **options):
+        count = suggestions.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Рекомендаций сохранено: {count}')
+        )
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.generations import bump
+from posts.models import Post
+from posts.storage import is_hashed
+
+
+def bump_generations(posts):
+    """Сдвигает поколения лент и страниц постов, как правка поста.
+
+    update() сигналов не шлёт, а фрагменты и ETag ссылались бы
+    на старые (а с --delete-old и удалённые) файлы.
+    """
+    posts = list(posts)
+    if not posts:
+        return
+    bump('index')
+    for scope, ids in (
+        ('author', {post.author_id for post in posts}),
+        ('group', {post.group_id for post in posts} - {None}),
+        ('post', {post.pk for post in posts}),
+    ):
+        for pk in ids:
+            bump(scope, pk)
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога posts/ '
+        'в дерево по хешу содержимого'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--delete-old', action='store_true',
+            help='удалять старый файл, если на него больше никто не ссылается',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        posts = Post.objects.exclude(image='').only('pk', 'image')
+        last_pk = 0
+        moved = missing = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_pk).order_by('pk')[
+                :options['chunk_size']
+            ])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            renamed = {}
+            for post in chunk:
+                old_name = post.image.name
+                if is_hashed(old_name) or old_name in renamed:
+                    continue
+                try:
+                    with storage.open(old_name) as content:
+                        renamed[old_name] = storage.save(old_name, content)
+                except OSError:
+                    missing += 1
+            affected = list(Post.objects.filter(
+                image__in=list(renamed)
+            ).only('pk', 'author_id', 'group_id'))
+            with transaction.atomic():
+                for old_name, new_name in renamed.items():
+                    moved += Post.objects.filter(image=old_name).update(
+                        image=new_name
+                    )
+            bump_generations(affected)
+            if options['delete_old']:
+                for old_name in renamed:
+                    storage.delete(old_name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {moved}, не найдено файлов: {missing}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов (FTS5)'
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            self.stdout.write('Полнотекстовый индекс есть только в SQLite')
+            return
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Индекс поиска пересобран'))
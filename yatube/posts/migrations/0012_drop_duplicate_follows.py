@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def drop_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = Follow.objects.values('user', 'author').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for row in duplicates:
+        Follow.objects.filter(
+            user=row['user'], author=row['author']
+        ).exclude(id=row['keep']).delete()
+
+
+# Повторные подписки убираются до того, как по ним заполнятся ленты
+# (0013) и счётчики (0014); ограничение unique_follow — в 0015.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_duplicate_follows, migrations.RunPython.noop
+        ),
+    ]
@@ -3,11 +3,24 @@ from django.contrib.auth import get_user_model
 from django.conf import settings
 
 from core.models import CreatedModel
+from .storage import ContentAddressedStorage
 
 
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек ленты: автор и группа одним запросом,
+        только те колонки, что выводит includes/card_post.html."""
+        return self.select_related('author', 'group').only(
+            'id', 'pub_date', 'text', 'image', 'image_width', 'image_height',
+            'author', 'author__username',
+            'author__first_name', 'author__last_name',
+            'group', 'group__slug', 'group__title',
+        )
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -31,12 +44,48 @@ class Post(CreatedModel):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        storage=ContentAddressedStorage(),
+    )
+    # заполняются при загрузке картинки, см. posts.images
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False,
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт', null=True, editable=False,
     )
+    image_hash = models.CharField(
+        'sha256 картинки', max_length=64, blank=True, editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name_plural = 'Посты'
+        indexes = (
+            # keyset-пагинация ленты, см. posts.paginators
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_id_idx'
+            ),
+            # ленты автора (profile) и группы (group_posts)
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:settings.POST_LENGTH]
@@ -67,6 +116,14 @@ class Comment(CreatedModel):
         help_text='Введите текст комментария',
     )
 
+    class Meta:
+        ordering = ('pub_date',)
+        indexes = (
+            models.Index(
+                fields=('post', 'pub_date'), name='comment_post_pub_date_idx'
+            ),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -81,3 +138,95 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Тот, на кого подписываются',
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        )
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами из posts.signals через F-выражения,
+    пересчитываются командой repair_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у каждого подписчика.
+
+    Заполняется при публикации (fan-out on write) сигналами из
+    posts.signals, поэтому follow_index читает диапазон по индексу
+    (follower, -pub_date) вместо соединения Follow с Post.
+    """
+    follower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        unique_together = ('follower', 'post')
+        indexes = (
+            models.Index(
+                fields=('follower', '-pub_date', '-post'),
+                name='timeline_follower_date_idx',
+            ),
+        )
+
+
+class Suggestion(models.Model):
+    """Рекомендация «кого почитать», посчитанная пакетно.
+
+    Таблицу целиком пересобирает команда build_suggestions
+    (posts.suggestions), виджет читает её одним запросом.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Кому рекомендуем',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggested_to',
+        verbose_name='Кого рекомендуем',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        unique_together = ('user', 'author')
+        indexes = (
+            # author — второй ключ сортировки виджета (suggestions.for_user)
+            models.Index(
+                fields=('user', '-score', 'author'),
+                name='suggestion_user_score_idx',
+            ),
+        )
@@ -0,0 +1,183 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def encode_cursor(direction, pub_date, pk):
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (direction, pub_date, pk) или None для битого курсора."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+COUNT_KEY = 'feed-count:{}'
+
+
+def count_key(feed, pk=None):
+    """Ключ кеша с числом постов ленты: 'index', 'group', 'author'..."""
+    return COUNT_KEY.format(feed if pk is None else f'{feed}:{pk}')
+
+
+def adjust_count(key, delta):
+    """Сдвигает закешированное число постов, не создавая новую запись."""
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, берущий общее число постов из кеша, а не из COUNT(*).
+
+    Записи поправляются на ±1 или сбрасываются сигналами posts.signals.
+    """
+
+    def __init__(self, object_list, per_page, cache_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+
+    @cached_property
+    def count(self):
+        total = cache.get(self.cache_key)
+        if total is None:
+            total = super().count
+            cache.add(
+                self.cache_key, total, settings.FEED_COUNT_CACHE_TIMEOUT
+            )
+        return total
+
+
+class CursorPage(Sequence):
+    """Страница ленты, заданная курсором по (pub_date, id)."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, cursor, paginator,
+                 has_next, has_previous):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def number(self):
+        return self.cursor or ''
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(FORWARD, last.pub_date, last.pk)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        first = self.object_list[0]
+        return encode_cursor(BACKWARD, first.pub_date, first.pk)
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (-pub_date, -id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: условие pub_date <= курсора
+    даёт диапазон по индексу post_pub_date_id_idx, и читается
+    per_page + 1 строка.
+    """
+
+    newest_first = True
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return self._page(self._ordered(self.object_list,
+                                            self.newest_first),
+                              None, FORWARD)
+        direction, pub_date, pk = decoded
+        # FORWARD идёт в порядке выдачи, BACKWARD — против него
+        descending = (direction == FORWARD) == self.newest_first
+        if descending:
+            queryset = self.object_list.filter(
+                Q(pub_date__lt=pub_date) | Q(pk__lt=pk),
+                pub_date__lte=pub_date,
+            )
+        else:
+            queryset = self.object_list.filter(
+                Q(pub_date__gt=pub_date) | Q(pk__gt=pk),
+                pub_date__gte=pub_date,
+            )
+        return self._page(self._ordered(queryset, descending),
+                          cursor, direction)
+
+    @staticmethod
+    def _ordered(queryset, descending):
+        if descending:
+            return queryset.order_by('-pub_date', '-pk')
+        return queryset.order_by('pub_date', 'pk')
+
+    def _page(self, queryset, cursor, direction):
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == BACKWARD:
+            rows.reverse()
+            return CursorPage(rows, cursor, self,
+                              has_next=True, has_previous=has_more)
+        return CursorPage(rows, cursor, self,
+                          has_next=has_more, has_previous=cursor is not None)
+
+
+class OldestFirstCursorPaginator(CursorPaginator):
+    """То же по (pub_date, id): комментарии читаются от старых к новым."""
+
+    newest_first = False
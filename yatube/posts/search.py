@@ -0,0 +1,284 @@
+"""Полнотекстовый поиск по Post.text на SQLite FTS5.
+
+Таблица posts_post_fts хранит только индекс (external content),
+текст берётся из posts_post. В актуальном состоянии её держат
+триггеры, так что bulk_create и QuerySet.update тоже попадают в поиск.
+SQLite пересоздаёт таблицу при части миграций и теряет её триггеры,
+поэтому install() повторяется после каждого migrate (см. apps.py).
+
+Выдача упорядочена по bm25 внутри окон свежих совпадений и листается
+курсором по (окно, score, id), см. SearchPaginator. На других СУБД
+поиск откатывается к icontains с курсором по дате.
+"""
+import base64
+import binascii
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection
+
+from .paginators import BACKWARD, FORWARD, CursorPage, CursorPaginator
+
+
+FTS_TABLE = 'posts_post_fts'
+INSTALL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    " text, content='posts_post', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai'
+    ' AFTER INSERT ON posts_post BEGIN'
+    f' INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);'
+    ' END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad'
+    ' AFTER DELETE ON posts_post BEGIN'
+    f' INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)'
+    " VALUES ('delete', old.id, old.text);"
+    ' END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au'
+    ' AFTER UPDATE OF text ON posts_post BEGIN'
+    f' INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)'
+    " VALUES ('delete', old.id, old.text);"
+    f' INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);'
+    ' END',
+)
+UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+WORD = re.compile(r'\w+')
+# Верхняя граница rowid для окна самых свежих совпадений
+NEWEST = 2 ** 63 - 1
+
+
+def enabled(connection=default_connection):
+    return connection.vendor == 'sqlite'
+
+
+def install(connection=default_connection):
+    """Создаёт индекс и триггеры, если их нет (идемпотентно)."""
+    if not enabled(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in INSTALL:
+            cursor.execute(statement)
+
+
+def uninstall(connection=default_connection):
+    if not enabled(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in UNINSTALL:
+            cursor.execute(statement)
+
+
+def rebuild(connection=default_connection):
+    """Перестраивает индекс по текущему содержимому posts_post."""
+    install(connection)
+    if enabled(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def match_expression(query):
+    """Запрос пользователя -> выражение MATCH.
+
+    Синтаксис FTS5 наружу не отдаётся: каждое слово берётся в кавычки
+    и ищется как префикс, чтобы «кот» находил «котика» и «коты».
+    Слова объединяются через AND. Пустая строка, если слов нет.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query.lower()))
+
+
+def matching_ids_sql():
+    """Подзапрос с id подходящих постов (параметр — match_expression)."""
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+
+
+def encode_cursor(direction, window, score, pk):
+    raw = f'{direction}|{window}|{score!r}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(direction, window, score, pk) или None для битого курсора."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, window, score, pk = raw.split('|')
+        window = int(window)
+        score = float(score)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if direction not in (FORWARD, BACKWARD):
+        return None
+    return direction, window, score, pk
+
+
+class SearchPage(CursorPage):
+    """Страница выдачи; у постов есть search_score (bm25)
+    и search_window (окно, см. SearchPaginator)."""
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(
+            FORWARD, last.search_window, last.search_score, last.pk
+        )
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        first = self.object_list[0]
+        return encode_cursor(
+            BACKWARD, first.search_window, first.search_score, first.pk
+        )
+
+
+class SearchPaginator:
+    """Keyset-пагинация выдачи FTS5 по окнам совпадений.
+
+    Совпадения делятся по rowid на окна по SEARCH_RANK_WINDOW постов,
+    от новых к старым. Внутри окна выдача идёт по (bm25, -id): bm25
+    в SQLite отрицательный, чем меньше, тем релевантнее, а при равной
+    релевантности выше более новые посты. Когда окно кончается, выдача
+    продолжается со следующего, более старого. Так запрос по частому
+    слову оценивает не больше окна постов, а старые совпадения
+    не теряются.
+
+    Окно задаётся верхней границей rowid и входит в курсор. bm25
+    зависит от всего индекса, так что после новых постов курсор
+    продолжает выдачу примерно с того же места, а не строго с той же
+    строки.
+    """
+
+    def __init__(self, object_list, query, per_page,
+                 connection=default_connection):
+        self.object_list = object_list
+        self.words = WORD.findall(query.lower())
+        self.match = match_expression(query)
+        self.per_page = int(per_page)
+        self.connection = connection
+
+    def get_page(self, cursor):
+        if not self.words:
+            return SearchPage([], None, self, False, False)
+        if not enabled(self.connection):
+            object_list = self.object_list
+            for word in self.words:
+                object_list = object_list.filter(text__icontains=word)
+            paginator = CursorPaginator(object_list, self.per_page)
+            return paginator.get_page(cursor)
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return self._page(self._forward(NEWEST, '', []), None, FORWARD)
+        direction, window, score, pk = decoded
+        if direction == FORWARD:
+            rows = self._forward(
+                window, 'WHERE score > %s OR (score = %s AND id < %s)',
+                [score, score, pk],
+            )
+        else:
+            rows = self._backward(
+                window, 'WHERE score < %s OR (score = %s AND id > %s)',
+                [score, score, pk],
+            )
+        return self._page(rows, cursor, direction)
+
+    def _forward(self, window, where, params):
+        """per_page + 1 строк после курсора, дальше — из старых окон."""
+        limit = self.per_page + 1
+        rows = self._scores(window, where, params, 'score, id DESC', limit)
+        while len(rows) < limit:
+            window = self._older(window)
+            if window is None:
+                break
+            rows += self._scores(
+                window, '', [], 'score, id DESC', limit - len(rows)
+            )
+        return rows
+
+    def _backward(self, window, where, params):
+        """per_page + 1 строк до курсора, дальше — из новых окон."""
+        limit = self.per_page + 1
+        rows = self._scores(window, where, params, 'score DESC, id', limit)
+        while len(rows) < limit and window != NEWEST:
+            window = self._newer(window)
+            rows += self._scores(
+                window, '', [], 'score DESC, id', limit - len(rows)
+            )
+        return rows
+
+    def _scores(self, window, where, params, ordering, limit):
+        """(id, score, window) совпадений окна в порядке ordering."""
+        sql = (
+            f'SELECT id, score FROM ('
+            f' SELECT rowid AS id, bm25({FTS_TABLE}) AS score'
+            f' FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid < %s'
+            f' ORDER BY rowid DESC LIMIT %s'
+            f') {where} ORDER BY {ordering} LIMIT %s'
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [
+                self.match, window, settings.SEARCH_RANK_WINDOW, *params,
+                limit,
+            ])
+            return [(pk, score, window) for pk, score in cursor.fetchall()]
+
+    def _older(self, window):
+        """Граница следующего окна или None, если старше совпадений нет."""
+        sql = (
+            f'SELECT rowid FROM {FTS_TABLE}'
+            f' WHERE {FTS_TABLE} MATCH %s AND rowid < %s'
+            f' ORDER BY rowid DESC LIMIT 2 OFFSET %s'
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                sql, [self.match, window, settings.SEARCH_RANK_WINDOW - 1]
+            )
+            rows = cursor.fetchall()
+        # граница — последний пост окна; второй пост значит, что за ним
+        # есть совпадения
+        return rows[0][0] if len(rows) == 2 else None
+
+    def _newer(self, window):
+        """Граница предыдущего окна: оно кончается постом window."""
+        sql = (
+            f'SELECT rowid FROM {FTS_TABLE}'
+            f' WHERE {FTS_TABLE} MATCH %s AND rowid >= %s'
+            f' ORDER BY rowid LIMIT 1 OFFSET %s'
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                sql, [self.match, window, settings.SEARCH_RANK_WINDOW]
+            )
+            row = cursor.fetchone()
+        return NEWEST if row is None else row[0]
+
+    def _page(self, rows, cursor, direction):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == BACKWARD:
+            rows.reverse()
+        posts = self.object_list.in_bulk([pk for pk, _, _ in rows])
+        object_list = []
+        for pk, score, window in rows:
+            # пост мог пропасть между двумя запросами
+            if pk in posts:
+                posts[pk].search_score = score
+                posts[pk].search_window = window
+                object_list.append(posts[pk])
+        if direction == BACKWARD:
+            return SearchPage(object_list, cursor, self,
+                              has_next=True, has_previous=has_more)
+        return SearchPage(object_list, cursor, self, has_next=has_more,
+                          has_previous=cursor is not None)
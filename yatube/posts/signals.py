@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feeds, images, timeline
+from .generations import bump
+from .models import Comment, Follow, Post, UserCounters
+from .paginators import adjust_count, count_key
+
+
+User = get_user_model()
+
+
+def timeline_enabled():
+    return settings.FOLLOW_FEED_STRATEGY == 'timeline'
+
+
+def followers_of(author_id):
+    return Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+
+
+def adjust_feed_counts(post, delta):
+    adjust_count(count_key('index'), delta)
+    adjust_count(count_key('author', post.author_id), delta)
+    if post.group_id is not None:
+        adjust_count(count_key('group', post.group_id), delta)
+    cache.delete_many([
+        count_key('follower', follower_id)
+        for follower_id in followers_of(post.author_id)
+    ])
+
+
+def bump_feed_generations(post, *group_ids):
+    bump('index')
+    bump('author', post.author_id)
+    bump('post', post.pk)
+    for group_id in {post.group_id, *group_ids} - {None}:
+        bump('group', group_id)
+    # ленты подписчиков не трогаем: /follow/ сверяется с поколениями
+    # 'author' своих авторов (posts.conditional.follow_scopes)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_pre_save(sender, instance, **kwargs):
+    images.update_metadata(instance)
+    instance._old_group_id = (
+        Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', flat=True
+        ).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        adjust_feed_counts(instance, 1)
+        feeds.invalidate_author(instance.author_id)
+        if timeline_enabled():
+            timeline.fan_out(instance)
+    elif instance._old_group_id != instance.group_id:
+        if instance._old_group_id is not None:
+            adjust_count(count_key('group', instance._old_group_id), -1)
+        if instance.group_id is not None:
+            adjust_count(count_key('group', instance.group_id), 1)
+    bump_feed_generations(instance, instance._old_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    adjust_feed_counts(instance, -1)
+    bump_feed_generations(instance)
+    feeds.invalidate_author(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    bump('post', instance.post_id)
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump('post', instance.post_id)
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        bump('follower', instance.user_id)
+        bump('following', instance.user_id)
+        bump('followers', instance.author_id)
+        cache.delete(count_key('follower', instance.user_id))
+        counters.bump_user(instance.user_id, 'following_count', 1)
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        if timeline_enabled():
+            timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump('follower', instance.user_id)
+    bump('following', instance.user_id)
+    bump('followers', instance.author_id)
+    cache.delete(count_key('follower', instance.user_id))
+    counters.bump_user(instance.user_id, 'following_count', -1)
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    if timeline_enabled():
+        timeline.remove_author(instance.user_id, instance.author_id)
@@ -0,0 +1,77 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл кладётся по sha256 содержимого в дерево из двух уровней:
+
+    posts/3a/7f/3a7f...c2.jpg
+
+В каталоге не копятся миллионы файлов, а одинаковые загрузки хранятся
+один раз: второй пост с той же картинкой получает то же имя файла.
+Поэтому файл нельзя удалять вместе с постом, пока на него ссылаются
+другие посты (модели Django файлы и так не удаляют).
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+HASH_ATTR = '_sha256'
+
+
+def remember_hash(content, digest):
+    """Запоминает sha256 файла, чтобы _save не читал его второй раз."""
+    setattr(content, HASH_ATTR, digest)
+
+
+def content_hash(content):
+    known = getattr(content, HASH_ATTR, None)
+    if known is not None:
+        return known
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """'posts/cat.JPG' + хеш -> 'posts/ab/cd/abcd....jpg'."""
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(
+        directory, digest[:2], digest[2:4], f'{digest}{extension}'
+    )
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+class AlreadyStored(Exception):
+    pass
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя выбирает _save по содержимому, суффиксы не нужны.
+        # Если файл с тем же хешем успел записать параллельный запрос,
+        # FileSystemStorage._save попросит другое имя — оно и не нужно.
+        if is_hashed(name) and self.exists(name):
+            raise AlreadyStored(name)
+        return name
+
+    def _save(self, name, content):
+        name = hashed_name(name, content_hash(content))
+        if self.exists(name):
+            return name
+        try:
+            return super()._save(name, content)
+        except AlreadyStored:
+            return name
@@ -0,0 +1,226 @@
+"""Рекомендации «кого почитать» по графу подписок.
+
+Граф Follow загружается целиком в CSR-матрицу смежности A на массивах
+array: строка — подписчик, столбцы — авторы, на которых он подписан.
+Для каждого пользователя u считаются:
+
+* друзья друзей — (A·A)[u, w]: сколько авторов u подписано на w;
+* общие подписки — (S·A)[u, w], где S[u, f] — число общих с f авторов
+  (S = A·Bᵀ). Авторы с подписчиками больше SUGGESTIONS_MAX_FOLLOWERS
+  в B не входят: подписка на них мало что говорит о вкусах.
+
+Оценка — сумма первого и второго с весом SUGGESTIONS_COFOLLOW_WEIGHT;
+в таблицу Suggestion попадают SUGGESTIONS_COUNT лучших авторов, на
+которых u ещё не подписан. Если установлены NumPy и SciPy, произведения
+считаются ими блоками по строкам, иначе — циклами по тем же массивам.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import follows
+from .generations import bump
+from .models import Follow, Suggestion
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:  # необязательные зависимости
+    numpy = sparse = None
+
+
+BATCH_SIZE = 500
+# Столько строк матрицы перемножается за раз при расчёте через SciPy
+BLOCK_SIZE = 1000
+
+
+class Graph:
+    """Граф подписок в CSR: ids[i] — id пользователя с индексом i.
+
+    Авторы строки i — indices[indptr[i]:indptr[i + 1]] по возрастанию,
+    её подписчики — t_indices[t_indptr[i]:t_indptr[i + 1]].
+    """
+
+    def __init__(self, ids, indptr, indices, t_indptr, t_indices):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.t_indptr = t_indptr
+        self.t_indices = t_indices
+
+    def __len__(self):
+        return len(self.ids)
+
+    def follows(self, row):
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def followers(self, row):
+        return self.t_indices[self.t_indptr[row]:self.t_indptr[row + 1]]
+
+    def followers_count(self, row):
+        return self.t_indptr[row + 1] - self.t_indptr[row]
+
+    @classmethod
+    def load(cls):
+        """Читает Follow одним проходом, отсортированным по (user, author)."""
+        users, authors = array('q'), array('q')
+        pairs = Follow.objects.order_by('user_id', 'author_id').values_list(
+            'user_id', 'author_id'
+        )
+        for user_id, author_id in pairs.iterator():
+            users.append(user_id)
+            authors.append(author_id)
+        ids = array('q', sorted(set(users) | set(authors)))
+        index = {pk: row for row, pk in enumerate(ids)}
+        rows = array('q', (index[pk] for pk in users))
+        cols = array('q', (index[pk] for pk in authors))
+        # ids по возрастанию, так что порядок пар сохраняется в индексах
+        indptr = offsets(rows, len(ids))
+        t_indptr = offsets(cols, len(ids))
+        t_indices = array('q', [0]) * len(cols)
+        position = array('q', t_indptr)
+        for row, col in zip(rows, cols):
+            t_indices[position[col]] = row
+            position[col] += 1
+        return cls(ids, indptr, cols, t_indptr, t_indices)
+
+
+def offsets(rows, size):
+    """indptr CSR: начало строк rows в списке пар, упорядоченном по ним."""
+    indptr = array('q', [0]) * (size + 1)
+    for row in rows:
+        indptr[row + 1] += 1
+    for row in range(size):
+        indptr[row + 1] += indptr[row]
+    return indptr
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def row_scores(graph, row):
+    """{столбец: оценка} кандидатов для строки row — циклами по CSR."""
+    weight = settings.SUGGESTIONS_COFOLLOW_WEIGHT
+    max_followers = settings.SUGGESTIONS_MAX_FOLLOWERS
+    scores = defaultdict(float)
+    own = graph.follows(row)
+    for friend in own:
+        for author in graph.follows(friend):
+            scores[author] += 1
+    overlap = defaultdict(int)
+    for author in own:
+        if graph.followers_count(author) > max_followers:
+            continue
+        for follower in graph.followers(author):
+            # сам row тоже попадёт сюда, но добавит лишь своих авторов,
+            # а они всё равно отсеиваются в top()
+            overlap[follower] += 1
+    for follower, common in overlap.items():
+        for author in graph.follows(follower):
+            scores[author] += weight * common
+    return scores
+
+
+def block_scores(graph):
+    """То же, что row_scores, матричными произведениями SciPy по блокам."""
+    size = len(graph)
+    a = sparse.csr_matrix(
+        (
+            numpy.ones(len(graph.indices)),
+            numpy.asarray(graph.indices), numpy.asarray(graph.indptr),
+        ),
+        shape=(size, size),
+    )
+    followers = numpy.diff(numpy.asarray(graph.t_indptr))
+    keep = sparse.diags(
+        (followers <= settings.SUGGESTIONS_MAX_FOLLOWERS).astype(float)
+    )
+    b = (a @ keep).tocsr()
+    weight = settings.SUGGESTIONS_COFOLLOW_WEIGHT
+    for start in range(0, size, BLOCK_SIZE):
+        block = a[start:start + BLOCK_SIZE]
+        scores = (block @ a + weight * ((block @ b.T) @ a)).tocsr()
+        for offset in range(scores.shape[0]):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            yield start + offset, dict(zip(
+                scores.indices[begin:end].tolist(),
+                scores.data[begin:end].tolist(),
+            ))
+
+
+def all_scores(graph):
+    """(строка, {столбец: оценка}) для всех, у кого есть подписки."""
+    if sparse is not None:
+        yield from block_scores(graph)
+        return
+    for row in range(len(graph)):
+        if graph.indptr[row] != graph.indptr[row + 1]:
+            yield row, row_scores(graph, row)
+
+
+def top(graph, row, scores, count):
+    """count лучших (столбец, оценка), кроме самого row и его подписок."""
+    own = graph.follows(row)
+    candidates = (
+        (col, score) for col, score in scores.items()
+        if score > 0 and col != row and not contains(own, col)
+    )
+    # при равной оценке — меньший id, чтобы порядок не зависел от пути
+    return heapq.nsmallest(
+        count, candidates, key=lambda item: (-item[1], graph.ids[item[0]])
+    )
+
+
+def rebuild():
+    """Пересчитывает таблицу Suggestion; возвращает число рекомендаций."""
+    graph = Graph.load()
+    count = settings.SUGGESTIONS_COUNT
+    total = 0
+    with transaction.atomic():
+        Suggestion.objects.all().delete()
+        batch = []
+        for row, scores in all_scores(graph):
+            batch.extend(
+                Suggestion(
+                    user_id=graph.ids[row], author_id=graph.ids[col],
+                    score=score,
+                )
+                for col, score in top(graph, row, scores, count)
+            )
+            if len(batch) >= BATCH_SIZE:
+                Suggestion.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        Suggestion.objects.bulk_create(batch)
+        total += len(batch)
+    # виджет есть на страницах с ETag (posts.conditional)
+    bump('suggestions')
+    return total
+
+
+def for_user(user, exclude=None):
+    """Рекомендации для виджета.
+
+    Подписки, оформленные после пересчёта, отсекаются по закешированному
+    follows.following_ids: строк у пользователя не больше
+    SUGGESTIONS_COUNT, так что фильтр в Python дешевле NOT IN в запросе.
+    """
+    if not user.is_authenticated:
+        return []
+    following = follows.following_ids(user.pk)
+    suggestions = Suggestion.objects.filter(user=user).select_related(
+        'author'
+    ).order_by('-score', 'author_id')
+    if exclude is not None:
+        suggestions = suggestions.exclude(author_id=exclude)
+    shown = [
+        suggestion for suggestion in suggestions
+        if not follows.contains(following, suggestion.author_id)
+    ]
+    return shown[:settings.SUGGESTIONS_SHOWN]
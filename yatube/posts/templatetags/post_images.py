@@ -0,0 +1,32 @@
+import logging
+
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+
+register = template.Library()
+logger = logging.getLogger(__name__)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """<picture> с вариантами картинки поста или исходник, пока их нет.
+
+    width и height берутся из настроек и сохранённых размеров картинки,
+    чтобы браузер заранее оставил место под неё.
+    """
+    try:
+        picture = thumbnails.picture(post)
+    except Exception:
+        # как и {% thumbnail %}, страница не падает из-за картинки
+        logger.exception('Не удалось получить варианты %s', post.image)
+        picture = None
+    width, height = settings.POST_IMAGE_SIZE
+    return {
+        'post': post,
+        'picture': picture,
+        'width': width,
+        'height': height,
+    }
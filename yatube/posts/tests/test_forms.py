@@ -1,5 +1,8 @@
+import multiprocessing
 import shutil
 import tempfile
+import time
+from hashlib import sha256
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -7,7 +10,11 @@ from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from .. import images
+from ..images import INVALID_IMAGE, run_verify
 from ..models import Post, Group, Comment
+from ..storage import hashed_name
+from ..uploads import too_large_message, too_many_pixels_message
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -77,10 +84,65 @@ class PostFormTests(TestCase):
         created_post_obj = list(set_diff)[0]
         self.assertEqual(created_post_obj.text, form_data['text'])
         self.assertEqual(created_post_obj.group, self.group)
-        self.assertEqual(created_post_obj.image, '{}{}'
-                         .format(Post._meta.get_field('image').upload_to,
-                                 form_data.get('image'))
-                         )
+        self.assertEqual(
+            created_post_obj.image,
+            hashed_name('posts/small.gif', sha256(self.small_gif).hexdigest())
+        )
+
+    def post_image(self, content):
+        image = SimpleUploadedFile(
+            name='image.gif', content=content, content_type='image/gif'
+        )
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Текст с картинкой', 'image': image},
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        return response.context['form'].errors.get('image')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=16)
+    def test_upload_over_size_limit_is_rejected(self):
+        """Файл больше лимита отбрасывается при чтении запроса."""
+        self.assertEqual(
+            self.post_image(self.small_gif), [too_large_message()]
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_upload_with_too_many_pixels_is_rejected(self):
+        """Размеры проверяются по заголовку до декодирования."""
+        self.assertEqual(
+            self.post_image(self.small_gif), [too_many_pixels_message()]
+        )
+
+    def test_broken_image_is_rejected(self):
+        """Обрезанная картинка не проходит полную проверку."""
+        self.assertEqual(self.post_image(self.small_gif[:-4]),
+                         [INVALID_IMAGE])
+
+    @staticmethod
+    def discard_pool():
+        if images._executor is not None:
+            images.discard_executor(images._executor)
+
+    @override_settings(IMAGE_VALIDATION_WORKERS=1)
+    def test_verify_in_process_pool(self):
+        self.addCleanup(self.discard_pool)
+        self.assertIsNone(run_verify(self.small_gif))
+        self.assertEqual(run_verify(b'not an image'), 'invalid')
+
+    @override_settings(IMAGE_VALIDATION_WORKERS=1,
+                       IMAGE_VALIDATION_TIMEOUT=0.001)
+    def test_verify_timeout_kills_pool(self):
+        """После таймаута процессы пула снимаются, а не досчитывают."""
+        self.addCleanup(self.discard_pool)
+        self.assertEqual(run_verify(self.small_gif), 'timeout')
+        deadline = time.time() + 5
+        while multiprocessing.active_children() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(multiprocessing.active_children(), [])
+        with override_settings(IMAGE_VALIDATION_TIMEOUT=30):
+            self.assertIsNone(run_verify(self.small_gif))
 
     def test_edit_post(self):
         """Валидная форма редактирует запись в Post."""
@@ -115,3 +177,40 @@ class PostFormTests(TestCase):
         self.assertEqual(Comment.objects.count(), comments_count + 1)
         last_obj = Comment.objects.all().last()
         self.assertEqual(last_obj.text, 'Тестовый комментарий')
+
+    def test_create_comment_by_fetch(self):
+        """XHR получает фрагмент нового комментария вместо редиректа."""
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            data={'text': 'Комментарий без перезагрузки'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        comment = Comment.objects.get(text='Комментарий без перезагрузки')
+        self.assertEqual(comment.post, self.post)
+        self.assertContains(response, f'id="comment-{comment.id}"')
+        self.assertNotContains(response, '<html')
+
+    def test_create_comment_as_json(self):
+        url = reverse('posts:add_comment', args=(self.post.id,))
+        response = self.authorized_client.post(
+            url, data={'text': 'Комментарий в JSON'},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['author'], self.user.username)
+        self.assertIn('Комментарий в JSON', data['html'])
+        response = self.authorized_client.post(
+            url, data={'text': ''}, HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_comment_to_missing_post(self):
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.post.id + 100,)),
+            data={'text': 'Комментарий'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text='Комментарий').exists())
@@ -1,8 +1,23 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.conf import settings
 
-from ..models import Group, Post
+from ..generations import get_generation
+from ..models import Comment, Follow, Group, Post, UserCounters
+from ..storage import is_hashed
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 User = get_user_model()
 
@@ -33,3 +48,127 @@ class PostModelTest(TestCase):
         group = self.group
         expected_object_name_group = group.title
         self.assertEqual(expected_object_name_group, str(group))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='test_author')
+        cls.reader = User.objects.create_user(username='test_reader')
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики обновляются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_repair_counters_command(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        UserCounters.objects.filter(user=self.author).update(posts_count=7)
+        UserCounters.objects.filter(user=self.reader).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        call_command('repair_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetadataTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user, text='Пост', image=SimpleUploadedFile(
+                'small.gif', self.small_gif, content_type='image/gif'
+            ),
+        )
+
+    def test_metadata_is_stored_on_upload(self):
+        post = self.create_post()
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(self.small_gif))
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(self.small_gif).hexdigest()
+        )
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
+
+    def test_backfill_image_metadata_command(self):
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_size=None,
+            image_hash='',
+        )
+        call_command('backfill_image_metadata', chunk_size=1,
+                     stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(self.small_gif))
+
+    def test_upload_is_hashed_once(self):
+        """Имя файла берётся из хеша, посчитанного для image_hash."""
+        with mock.patch('posts.storage.hashlib') as storage_hashlib:
+            post = self.create_post()
+        storage_hashlib.sha256.assert_not_called()
+        self.assertIn(post.image_hash, post.image.name)
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.create_post(), self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed(first.image.name))
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)
+        ])
+
+    def test_migrate_post_images_command(self):
+        post = self.create_post()
+        storage = post.image.storage
+        flat_name = 'posts/old.gif'
+        with open(os.path.join(TEMP_MEDIA_ROOT, flat_name), 'wb') as file:
+            file.write(self.small_gif)
+        Post.objects.filter(pk=post.pk).update(image=flat_name)
+        generation = get_generation('post', post.pk)
+        call_command('migrate_post_images', delete_old=True,
+                     stdout=StringIO())
+        post.refresh_from_db()
+        self.assertNotEqual(get_generation('post', post.pk), generation)
+        self.assertTrue(is_hashed(post.image.name))
+        self.assertTrue(storage.exists(post.image.name))
+        self.assertFalse(storage.exists(flat_name))
@@ -39,10 +39,13 @@ class PostURLTests(TestCase):
              f'/profile/{cls.user.username}/'),
             ('posts:post_detail', (cls.post.id,),
              f'/posts/{cls.post.id}/'),
+            ('posts:post_comments', (cls.post.id,),
+             f'/posts/{cls.post.id}/comments/'),
             ('posts:post_edit', (cls.post.id,),
              f'/posts/{cls.post.id}/edit/'),
             ('posts:post_create', None, '/create/'),
             ('posts:follow_index', None, '/follow/'),
+            ('posts:search', None, '/search/'),
         )
 
     def test_check_reverse(self):
@@ -108,6 +111,7 @@ class PostURLTests(TestCase):
                     args=(self.post.id,)): 'posts/create_post.html',
             reverse('posts:post_create'): 'posts/create_post.html',
             reverse('posts:follow_index'): 'posts/follow.html',
+            reverse('posts:search'): 'posts/search.html',
         }
         for address, template in templates_pages_names.items():
             with self.subTest(address=address):
@@ -1,16 +1,28 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock, skipIf
 
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.test import Client, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django import forms
+from sorl.thumbnail import default as thumbnail_default
 
-from ..models import Post, Group, Comment, Follow
+from core.swr import LOCK_KEY
+from core.templatetags.pagination import ELLIPSIS, elided_page_range
+
+from ..models import (
+    Comment, Follow, Group, Post, Suggestion, TimelineEntry,
+)
 from ..forms import CommentForm
+from ..paginators import count_key
+from .. import follows, suggestions, thumbnails
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -57,6 +69,228 @@ class PaginatorViewsTest(TestCase):
                     )
 
 
+class PageWindowTest(SimpleTestCase):
+    def test_short_range_is_full(self):
+        self.assertEqual(list(elided_page_range(5, 3)), [1, 2, 3, 4, 5])
+
+    def test_long_range_is_windowed(self):
+        """Для 10 000 страниц выводятся края и окно вокруг текущей."""
+        self.assertEqual(
+            list(elided_page_range(10_000, 5_000)),
+            [1, ELLIPSIS, 4998, 4999, 5000, 5001, 5002, ELLIPSIS, 10_000],
+        )
+        self.assertEqual(
+            list(elided_page_range(10_000, 1)), [1, 2, 3, ELLIPSIS, 10_000]
+        )
+
+
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_read_from_cache(self):
+        """Paginator берёт число постов из кеша, а не из COUNT(*)."""
+        cache.set(count_key('index'), 42)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 42)
+
+    def test_signals_adjust_cached_counts(self):
+        keys = (
+            count_key('index'),
+            count_key('group', self.group.pk),
+            count_key('author', self.user.pk),
+        )
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:group_list', args=(self.group.slug,)))
+        self.client.get(reverse('posts:profile', args=(self.user.username,)))
+        self.assertEqual(list(cache.get_many(keys).values()), [1, 1, 1])
+        post = Post.objects.create(
+            author=self.user, text='Ещё пост', group=self.group
+        )
+        self.assertEqual(list(cache.get_many(keys).values()), [2, 2, 2])
+        post.delete()
+        self.assertEqual(list(cache.get_many(keys).values()), [1, 1, 1])
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание',
+        )
+        for i in range(settings.POSTS_PER_PAGE):
+            author = User.objects.create_user(username=f'test_author_{i}')
+            Post.objects.create(
+                author=author, text=f'Пост {i}', group=cls.group
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.author = author
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_pages_query_count(self):
+        # COUNT, выборка страницы и, где нужно, группа или автор
+        pages = (
+            (reverse('posts:index'), 2),
+            (reverse('posts:group_list', args=(self.group.slug,)), 3),
+            (reverse('posts:profile', args=(self.author.username,)), 3),
+        )
+        for url, queries in pages:
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.client.get(url)
+
+    def test_cached_fragment_skips_page_queries(self):
+        """При попадании во фрагментный кеш COUNT и выборка страницы
+        не выполняются."""
+        pages = (
+            (reverse('posts:index'), 0),
+            (reverse('posts:group_list', args=(self.group.slug,)), 1),
+            (reverse('posts:profile', args=(self.author.username,)), 1),
+        )
+        for url, queries in pages:
+            self.client.get(url)
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.client.get(url)
+
+    def test_junk_page_numbers_share_fragment(self):
+        """?page= с мусором или за концом ленты попадает во фрагмент
+        той страницы, которую покажет пагинатор."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        for page in ('abc', '999', '-1', '01'):
+            with self.subTest(page=page), self.assertNumQueries(0):
+                self.client.get(url, {'page': page})
+
+    def test_follow_index_query_count(self):
+        self.client.force_login(self.reader)
+        self.client.get(reverse('posts:follow_index'))
+        cache.clear()
+        # сессия, пользователь, COUNT, выборка страницы, подписки
+        # (following_ids, дальше из кеша) и рекомендации
+        with self.assertNumQueries(6):
+            self.client.get(reverse('posts:follow_index'))
+
+
+@override_settings(POSTS_PAGINATION='cursor')
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        for i in range(
+            settings.POSTS_PER_PAGE + settings.POSTS_ON_SECOND_PAGE
+        ):
+            Post.objects.create(author=cls.user, text=f'Тестовый пост {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсоры ведут вперёд и назад без пропусков и повторов."""
+        url = reverse('posts:profile', args=(self.user.username,))
+        first = self.client.get(url).context.get('page_obj')
+        self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+        self.assertFalse(first.has_previous())
+        self.assertIsNotNone(first.next_cursor)
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context.get('page_obj')
+        self.assertEqual(len(second), settings.POSTS_ON_SECOND_PAGE)
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            {post.id for post in first} | {post.id for post in second},
+            set(Post.objects.values_list('id', flat=True)),
+        )
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context.get('page_obj')
+        self.assertEqual(list(back), list(first))
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'не курсор'}
+        )
+        self.assertEqual(
+            len(response.context.get('page_obj')), settings.POSTS_PER_PAGE
+        )
+
+    def test_broken_cursor_shares_first_page_fragment(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url, {'cursor': 'не курсор'})
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='test_author'),
+            text='Тестовый пост',
+        )
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader_{i}'),
+                text=f'Комментарий {i}',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_comments_inline_and_rest_as_fragment(self):
+        """Первая порция на странице поста, остальные — фрагментом."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,))
+        )
+        first = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in first],
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        self.assertTrue(first.has_next())
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.id,)),
+            {'comments': first.next_cursor},
+        )
+        rest = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in rest],
+            ['Комментарий 3', 'Комментарий 4'],
+        )
+        self.assertFalse(rest.has_next())
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'reader_4')
+
+    def test_comment_authors_do_not_add_queries(self):
+        url = reverse('posts:post_comments', args=(self.post.id,))
+        # пост и одна порция комментариев с авторами
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostPagesTests(TestCase):
     @classmethod
@@ -108,7 +342,8 @@ class PostPagesTests(TestCase):
         self.assertEqual(first_object.text, self.post.text)
         self.assertEqual(first_object.author, self.user)
         self.assertEqual(first_object.group, self.group)
-        self.assertEqual(first_object.image, f'posts/{self.uploaded.name}')
+        self.assertEqual(first_object.image, self.post.image.name)
+        self.assertTrue(first_object.image.name.endswith('.gif'))
 
     def test_post_or_page_obj_context(self):
         pages = (
@@ -170,22 +405,25 @@ class PostPagesTests(TestCase):
         )
 
     def test_check_cache_index_page(self):
-        """Проверка кеширования главной страницы."""
-        self.post_2 = Post.objects.create(
+        """Главная страница отдаётся из кеша, пока лента не меняется,
+        и обновляется сразу после изменения."""
+        post_2 = Post.objects.create(
             text='Текст 2',
             author=self.user,
             group=self.group,
         )
         response = self.authorized_client.get(reverse('posts:index'))
         resp_content_1 = response.content
-        Post.objects.get(id=self.post_2.id).delete()
+        # update() не шлёт сигналов: поколение ленты не меняется
+        Post.objects.filter(id=post_2.id).update(text='Текст 3')
         response = self.authorized_client.get(reverse('posts:index'))
         resp_content_2 = response.content
         self.assertEqual(resp_content_1, resp_content_2)
-        cache.clear()
+        post_2.delete()
         response = self.authorized_client.get(reverse('posts:index'))
         resp_content_3 = response.content
         self.assertNotEqual(resp_content_2, resp_content_3)
+        self.assertNotIn(post_2, response.context['page_obj'])
 
 
 class FollowViewsTests(TestCase):
@@ -223,6 +461,95 @@ class FollowViewsTests(TestCase):
             reverse('posts:profile_unfollow', args=(self.author.username,)))
         self.assertEqual(Follow.objects.count(), follow_count - 1)
 
+    def test_old_follow_urls_redirect_to_profile(self):
+        profile = reverse('posts:profile', args=(self.author.username,))
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(name=name):
+                response = self.authorized_client_follower.get(
+                    reverse(name, args=(self.author.username,))
+                )
+                self.assertRedirects(response, profile)
+
+    def test_follow_toggle_is_idempotent(self):
+        """Повторная подписка не создаёт строк и не сдвигает счётчики."""
+        url = reverse('posts:follow_toggle', args=(self.author.username,))
+        for _ in range(2):
+            response = self.authorized_client_follower.post(
+                url, {'follow': '1'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+            self.assertContains(response, 'Отписаться')
+            self.assertContains(response, 'data-followers="1"')
+        self.assertEqual(
+            Follow.objects.filter(
+                user=self.follower, author=self.author
+            ).count(), 1
+        )
+        response = self.authorized_client_follower.post(
+            url, {'follow': '0'}, HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(
+            response.json(), {'following': False, 'followers_count': 0}
+        )
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_toggle_without_js(self):
+        url = reverse('posts:follow_toggle', args=(self.author.username,))
+        response = self.authorized_client_follower.post(url, {'follow': '1'})
+        self.assertRedirects(
+            response, reverse('posts:profile', args=(self.author.username,))
+        )
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            self.authorized_client_follower.get(url).status_code, 405
+        )
+
+    def test_follow_self_is_ignored(self):
+        url = reverse('posts:follow_toggle', args=(self.author.username,))
+        response = self.authorized_client_author.post(
+            url, {'follow': '1'}, HTTP_ACCEPT='application/json'
+        )
+        self.assertFalse(response.json()['following'])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_following_ids_are_cached_until_follow_changes(self):
+        cache.clear()
+        self.assertFalse(
+            follows.is_following(self.follower.pk, self.author.pk)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(list(follows.following_ids(self.follower.pk)),
+                             [])
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertTrue(
+            follows.is_following(self.follower.pk, self.author.pk)
+        )
+        Follow.objects.filter(user=self.follower).delete()
+        self.assertFalse(
+            follows.is_following(self.follower.pk, self.author.pk)
+        )
+
+    def test_following_ids_survive_new_posts(self):
+        """Посты авторов не сбрасывают закешированный список подписок."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        follows.following_ids(self.follower.pk)
+        Post.objects.create(text='Новый пост', author=self.author)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(follows.following_ids(self.follower.pk)),
+                             [self.author.pk])
+
+    def test_join_feed_uses_following_ids(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        url = reverse('posts:follow_index')
+        for limit in (500, 0):
+            with self.subTest(limit=limit), self.settings(
+                FOLLOW_FEED_STRATEGY='join', FOLLOWING_IN_LIMIT=limit
+            ):
+                cache.clear()
+                response = self.authorized_client_follower.get(url)
+                self.assertEqual(
+                    list(response.context['page_obj']), [self.post]
+                )
+
     def test_follow_index_show_posts(self):
         """Новая запись пользователя появляется в ленте тех,
         кто на него подписан"""
@@ -235,3 +562,442 @@ class FollowViewsTests(TestCase):
             reverse('posts:follow_index')
         )
         self.assertIn(self.post, response.context.get('page_obj'))
+
+    def test_follow_index_timeline(self):
+        """Лента подписок обновляется при публикации, удалении поста
+        и отписке."""
+        url = reverse('posts:follow_index')
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        page_obj = self.authorized_client_follower.get(url).context.get(
+            'page_obj'
+        )
+        self.assertEqual(list(page_obj), [new_post, self.post])
+        new_post.delete()
+        page_obj = self.authorized_client_follower.get(url).context.get(
+            'page_obj'
+        )
+        self.assertEqual(list(page_obj), [self.post])
+        Follow.objects.filter(user=self.follower, author=self.author).delete()
+        self.assertFalse(self.follower.timeline.exists())
+
+    def test_rebuild_timelines_command(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(self.follower.timeline.values_list('post', flat=True)),
+            [self.post.id],
+        )
+
+
+@override_settings(FOLLOW_FEED_STRATEGY='merge')
+class MergedFeedViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username='test_follower')
+        cls.authors = [
+            User.objects.create_user(username=f'test_author_{i}')
+            for i in range(3)
+        ]
+        for i in range(settings.POSTS_PER_PAGE * 2):
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.authors[i % len(cls.authors)]
+            )
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.follower, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.follower)
+
+    def get_feed(self, page=1):
+        return self.client.get(
+            reverse('posts:follow_index'), {'page': page}
+        ).context.get('page_obj')
+
+    def test_merged_feed_matches_join(self):
+        """Слияние списков авторов даёт ту же ленту, что и join."""
+        expected = list(Post.objects.filter(
+            author__following__user=self.follower
+        ).order_by('-pub_date', '-pk'))
+        page_obj = self.get_feed()
+        self.assertEqual(page_obj.paginator.count, len(expected))
+        self.assertEqual(
+            list(page_obj) + list(self.get_feed(2)), expected
+        )
+
+    def test_new_post_invalidates_author_list(self):
+        self.get_feed()
+        post = Post.objects.create(text='Свежий', author=self.authors[0])
+        self.assertEqual(self.get_feed()[0], post)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_group', description='Тест',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group,
+        )
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_pages_answer_304_without_queries(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_group'}),
+            reverse('posts:profile', kwargs={'username': 'test_author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(0 if url == urls[0] else 1):
+                    response = self.revalidate(url, response)
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_etag(self):
+        url = reverse('posts:group_list', kwargs={'slug': 'test_group'})
+        response = self.client.get(url)
+        Post.objects.create(
+            text='Новый пост', author=self.author, group=self.group,
+        )
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_follow_changes_profile_etag(self):
+        url = reverse('posts:profile', kwargs={'username': 'test_author'})
+        response = self.client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_own_follow_changes_profile_etag(self):
+        """Число подписок в профиле x меняется, когда x подписывается."""
+        url = reverse('posts:profile', kwargs={'username': 'test_reader'})
+        response = self.client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_stale_fragment_is_served_without_validators(self):
+        """Пока фрагмент новой версии считает другой запрос, старая копия
+        уходит без ETag и Last-Modified — иначе её закрепил бы 304."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        lock = LOCK_KEY.format(make_template_fragment_key('index_page', [1]))
+        cache.add(lock, True)
+        response = self.client.get(url)
+        self.assertNotContains(response, new_post.text)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        cache.delete(lock)
+        response = self.client.get(url)
+        self.assertContains(response, new_post.text)
+        self.assertIn('ETag', response)
+
+    def test_etag_depends_on_viewer(self):
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_follow_index_etag(self):
+        self.client.force_login(self.reader)
+        url = reverse('posts:follow_index')
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_followed_author_post_changes_follow_index_etag(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        url = reverse('posts:follow_index')
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_missing_object_is_404(self):
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'nobody'}),
+            HTTP_IF_NONE_MATCH='*',
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(POSTS_PER_PAGE=3)
+class SearchViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.cats = [
+            Post.objects.create(text=f'Котики номер {i}', author=cls.user)
+            for i in range(5)
+        ]
+        cls.dog = Post.objects.create(text='Собака и кот', author=cls.user)
+        Post.objects.create(text='Про погоду', author=cls.user)
+
+    def search(self, q, cursor=None):
+        params = {'q': q}
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(reverse('posts:search'), params).context
+
+    def test_prefix_search_and_cursor(self):
+        """Все страницы выдачи без повторов, по словоформам."""
+        found = []
+        page_obj = self.search('кот')['page_obj']
+        found += list(page_obj)
+        while page_obj.has_next():
+            page_obj = self.search('кот', page_obj.next_cursor)['page_obj']
+            found += list(page_obj)
+        self.assertCountEqual(found, self.cats + [self.dog])
+        previous = self.search('кот', page_obj.previous_cursor)['page_obj']
+        self.assertEqual(list(previous), found[:3])
+
+    @override_settings(SEARCH_RANK_WINDOW=2)
+    def test_results_continue_past_rank_window(self):
+        """Выдача доходит до старых совпадений и листается назад."""
+        pages = [self.search('кот')['page_obj']]
+        while pages[-1].has_next():
+            pages.append(
+                self.search('кот', pages[-1].next_cursor)['page_obj']
+            )
+        found = [post for page in pages for post in page]
+        self.assertCountEqual(found, self.cats + [self.dog])
+        # окна идут от новых постов к старым
+        self.assertCountEqual(found[:2], [self.dog, self.cats[-1]])
+        for page, previous in zip(pages[1:], pages):
+            back = self.search('кот', page.previous_cursor)['page_obj']
+            self.assertEqual(list(back), list(previous))
+
+    def test_all_words_must_match(self):
+        page_obj = self.search('собака кот')['page_obj']
+        self.assertEqual(list(page_obj), [self.dog])
+
+    def test_fts_syntax_is_not_exposed(self):
+        for query in ('"кот', 'кот OR NOT', '*', 'text:кот'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(text='Уникальное слово', author=self.user)
+        post.text = 'Совсем другое'
+        post.save()
+        self.assertEqual(len(self.search('уникальное')['page_obj']), 0)
+        self.assertEqual(list(self.search('другое')['page_obj']), [post])
+        post.delete()
+        self.assertEqual(len(self.search('другое')['page_obj']), 0)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dog]
+        )
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, func, *args):
+        self.tasks.append((func, args))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class BackgroundThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # LRU kvstore живёт в процессе и переживает cache.clear()
+        thumbnail_default.kvstore.clear()
+        self.executor = FakeExecutor()
+        patches = [
+            mock.patch.object(thumbnails, 'executor', lambda: self.executor),
+            # TestCase не фиксирует транзакцию, on_commit выполняем сразу
+            mock.patch.object(
+                thumbnails.transaction, 'on_commit', lambda func: func()
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client.force_login(self.user)
+
+    def upload(self):
+        return SimpleUploadedFile(
+            'small.gif', self.small_gif, content_type='image/gif'
+        )
+
+    def run_tasks(self):
+        for func, args in self.executor.tasks:
+            func(*args)
+        self.executor.tasks.clear()
+
+    def test_post_create_queues_thumbnails(self):
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'С картинкой', 'image': self.upload()},
+        )
+        post = Post.objects.get()
+        self.assertEqual(len(self.executor.tasks), 1)
+        _, (name, geometries) = self.executor.tasks[0]
+        self.assertEqual(name, post.image.name)
+        # картинка 2x1 — только самый узкий вариант, без растягивания
+        self.assertEqual(geometries, thumbnails.variants(post.image_width))
+        self.assertEqual(len(geometries), len(thumbnails.image_formats()))
+
+    def test_original_image_until_thumbnail_is_ready(self):
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=self.upload()
+        )
+        self.executor.tasks.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+        # повторный показ не ставит файл в очередь второй раз
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(len(self.executor.tasks), 1)
+
+        self.run_tasks()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, post.image.url)
+        self.assertContains(response, '<picture>')
+
+    def test_page_thumbnails_are_prefetched_in_one_query(self):
+        for i in range(3):
+            thumbnails.schedule_post(Post.objects.create(
+                text=f'Текст {i}', author=self.user, image=self.upload()
+            ))
+        self.run_tasks()
+        self.client.logout()
+        cache.clear()
+        thumbnail_default.kvstore.lru.clear()
+        # COUNT, страница постов и одна выборка kvstore на все миниатюры
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<picture>', count=3)
+
+
+class SuggestionsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = {
+            name: User.objects.create_user(username=f'user_{name}')
+            for name in 'abcde'
+        }
+        for user, author in ('ab', 'bc', 'bd', 'eb', 'ed'):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def suggested(self, name):
+        return [
+            (suggestion.author.username, suggestion.score)
+            for suggestion in Suggestion.objects.filter(
+                user=self.users[name]
+            ).order_by('-score', 'author_id')
+        ]
+
+    def test_friends_of_friends_and_co_follows(self):
+        """b даёт a авторов c и d, а общий с e автор b добавляет d."""
+        call_command('build_suggestions', stdout=StringIO())
+        self.assertEqual(
+            self.suggested('a'), [('user_d', 1.5), ('user_c', 1.0)]
+        )
+        self.assertNotIn('user_a', dict(self.suggested('e')))
+
+    @override_settings(SUGGESTIONS_MAX_FOLLOWERS=1)
+    def test_popular_authors_do_not_count_as_co_follows(self):
+        suggestions.rebuild()
+        self.assertEqual(
+            self.suggested('a'), [('user_c', 1.0), ('user_d', 1.0)]
+        )
+
+    def test_widget_reads_table_and_skips_new_follows(self):
+        suggestions.rebuild()
+        client = Client()
+        client.force_login(self.users['a'])
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [item.author for item in response.context['suggestions']],
+            [self.users['d'], self.users['c']],
+        )
+        Follow.objects.create(user=self.users['a'], author=self.users['d'])
+        response = client.get(
+            reverse('posts:profile', args=(self.users['b'].username,))
+        )
+        self.assertEqual(
+            [item.author for item in response.context['suggestions']],
+            [self.users['c']],
+        )
+
+    @skipIf(suggestions.sparse is None, 'нет SciPy')
+    def test_scipy_matches_array_scores(self):
+        graph = suggestions.Graph.load()
+        for row, scores in suggestions.block_scores(graph):
+            with self.subTest(row=row):
+                expected = suggestions.row_scores(graph, row)
+                self.assertEqual(
+                    suggestions.top(graph, row, scores, 10),
+                    suggestions.top(graph, row, expected, 10),
+                )
@@ -0,0 +1,328 @@
+"""Миниатюры постов готовятся в фоне, а не в запросе, который их показал.
+
+THUMBNAIL_BACKEND указывает на BackgroundThumbnailBackend: тег
+{% thumbnail %} получает миниатюру, только если она уже есть в kvstore
+sorl. Иначе генерация ставится в очередь локального пула потоков,
+а шаблон до тех пор показывает исходную картинку.
+
+Сразу после сохранения картинки post_create и post_edit ставят в очередь
+все варианты (variants(): ширины POST_IMAGE_WIDTHS в форматах
+POST_IMAGE_FORMATS), так что обычно первый же показ находит их готовыми.
+Шаблоны выводят варианты через {% post_picture %} как <picture>/srcset.
+
+BatchedKVStore — kvstore sorl, который paging() заполняет одним
+get_many на всю страницу (prefetch), а не запросом на каждый тег.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from PIL import features
+from django.core.cache import cache
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+logger = logging.getLogger(__name__)
+
+QUEUED_KEY = 'thumbnail-queued:{}'
+# Сколько не ставить один файл в очередь повторно
+QUEUED_TIMEOUT = 5 * 60
+
+# kvstore хранит в кеше «нет записи», чтобы не ходить в базу повторно
+MISSING = ''
+IMAGE_IDENTITY = '||image||'
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def image_formats():
+    """POST_IMAGE_FORMATS, которые умеет кодировать установленный Pillow."""
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format != 'WEBP' or features.check('webp')
+    ]
+
+
+def geometry(width):
+    base_width, base_height = settings.POST_IMAGE_SIZE
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+def widths(source_width=None):
+    """Ширины вариантов; шире исходника (если он известен) не растягиваем.
+
+    source_width — Post.image_width, сохранённый при загрузке, так что
+    файл для этого не открывается.
+    """
+    result = [
+        width for width in settings.POST_IMAGE_WIDTHS
+        if not source_width or width <= source_width
+    ]
+    return result or [min(settings.POST_IMAGE_WIDTHS)]
+
+
+def variants(source_width=None):
+    """Все (геометрия, опции sorl) вариантов картинки поста."""
+    return [
+        (geometry(width), {
+            'crop': 'center', 'upscale': True, 'format': image_format,
+            'quality': settings.POST_IMAGE_QUALITY,
+        })
+        for image_format in image_formats()
+        for width in widths(source_width)
+    ]
+
+
+def picture(post):
+    """Источники <picture> для картинки или None, пока они не готовы.
+
+    {'sources': [{'type', 'src', 'srcset'}, ...], 'img': {...}}:
+    последний формат POST_IMAGE_FORMATS (JPEG) идёт в <img>, остальные —
+    в <source>. Недостающие варианты ставятся в очередь одной задачей.
+    """
+    ready = {}
+    missing = []
+    image = post.image
+    for geometry_string, options in variants(post.image_width):
+        thumbnail = default.backend.ready_thumbnail(
+            image, geometry_string, **options
+        )
+        if thumbnail:
+            ready[geometry_string, options['format']] = thumbnail
+        else:
+            missing.append((geometry_string, options))
+    if missing:
+        schedule(image.name, missing)
+        return None
+    sources = []
+    for image_format in image_formats():
+        srcset = [
+            (ready[geometry(width), image_format].url, width)
+            for width in widths(post.image_width)
+        ]
+        sources.append({
+            'type': MIME_TYPES.get(image_format, ''),
+            # src для браузеров без srcset — ширина ближе всего к базовой
+            'src': min(srcset, key=lambda item: abs(
+                item[1] - settings.POST_IMAGE_SIZE[0]
+            ))[0],
+            'srcset': ', '.join(f'{url} {width}w' for url, width in srcset),
+        })
+    if not sources:
+        return None
+    return {'sources': sources[:-1], 'img': sources[-1]}
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Отдаёт готовую миниатюру или исходник, не ресайзя в запросе."""
+
+    def thumbnail_file(self, source, geometry_string, options):
+        """ImageFile миниатюры с теми же опциями, что у sorl."""
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None; при THUMBNAIL_WORKERS = 0 создаёт."""
+        if not settings.THUMBNAIL_WORKERS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        thumbnail = self.thumbnail_file(
+            ImageFile(file_), geometry_string, dict(options)
+        )
+        return default.kvstore.get(thumbnail)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        thumbnail = self.ready_thumbnail(file_, geometry_string, **options)
+        if thumbnail:
+            return thumbnail
+        source = ImageFile(file_)
+        schedule(source.name, [(geometry_string, options)])
+        return source
+
+    def generate(self, file_, geometry_string, **options):
+        """Синхронно создаёт миниатюру — для фоновых потоков."""
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def generate_all(name, geometries):
+    """Создаёт миниатюры файла name по списку (геометрия, опции).
+
+    Готовые миниатюры попадают в уже закешированные фрагменты лент
+    только с новым поколением, поэтому посты с этой картинкой
+    сдвигают поколения, как при правке.
+    """
+    from .models import Post
+    from .signals import bump_feed_generations
+
+    # хранилище поля входит в ключ kvstore — то же, что у post.image
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    try:
+        for geometry, options in geometries:
+            default.backend.generate(source, geometry, **options)
+        for post in Post.objects.filter(image=name):
+            bump_feed_generations(post, post.group_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        cache.delete_many(
+            [queued_key(name, geometry) for geometry, _ in geometries]
+        )
+        if settings.THUMBNAIL_WORKERS:
+            # соединения потока пула иначе остаются открытыми
+            connections.close_all()
+
+
+def queued_key(name, geometry):
+    return QUEUED_KEY.format(f'{geometry}:{name}')
+
+
+def schedule(name, geometries):
+    """Ставит миниатюры в очередь пула; уже стоящие там пропускаются.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу (тесты, отладка).
+    """
+    geometries = [
+        (geometry, options) for geometry, options in geometries
+        if cache.add(queued_key(name, geometry), True, QUEUED_TIMEOUT)
+    ]
+    if not geometries:
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        generate_all(name, geometries)
+        return
+    # файл и строка поста должны быть видны потоку пула
+    transaction.on_commit(
+        lambda: executor().submit(generate_all, name, geometries)
+    )
+
+
+def schedule_post(post):
+    if post.image:
+        schedule(post.image.name, variants(post.image_width))
+
+
+class BatchedKVStore(KVStore):
+    """cached_db kvstore с LRU в памяти процесса и пакетной загрузкой.
+
+    В LRU попадают только найденные описания картинок: они не меняются,
+    а списки миниатюр и отсутствие записи может поправить другой процесс.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+
+    def clear(self, delete_thumbnails=False):
+        with self.lock:
+            self.lru.clear()
+        super().clear(delete_thumbnails)
+
+    def _remember(self, key, value):
+        if IMAGE_IDENTITY not in key:
+            return
+        with self.lock:
+            self.lru[key] = value
+            self.lru.move_to_end(key)
+            while len(self.lru) > settings.THUMBNAIL_LRU_SIZE:
+                self.lru.popitem(last=False)
+
+    def _recall(self, key):
+        with self.lock:
+            value = self.lru.get(key)
+            if value is not None:
+                self.lru.move_to_end(key)
+            return value
+
+    def _get_raw(self, key):
+        value = self._recall(key)
+        if value is not None:
+            return value
+        value = self.cache.get(key)
+        if value is None:
+            row = KVStoreModel.objects.filter(key=key).first()
+            value = MISSING if row is None else row.value
+            self.cache.set(key, value, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        if value == MISSING:
+            return None
+        self._remember(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.lru.pop(key, None)
+        super()._delete_raw(*keys)
+
+    def prefetch(self, keys):
+        """Загружает записи keys в LRU: один get_many и один запрос."""
+        keys = [key for key in keys if self._recall(key) is None]
+        if not keys:
+            return
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            rows = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            loaded = {key: rows.get(key, MISSING) for key in missing}
+            self.cache.set_many(
+                loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            found.update(loaded)
+        for key, value in found.items():
+            if value != MISSING:
+                self._remember(key, value)
+
+
+def prefetch(posts):
+    """Готовит kvstore к показу вариантов картинок posts."""
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'prefetch'):
+        return
+    backend = default.backend
+    keys = []
+    for post in posts:
+        if not post.image:
+            continue
+        source = ImageFile(post.image)
+        for geometry, options in variants(post.image_width):
+            thumbnail = backend.thumbnail_file(source, geometry, dict(options))
+            keys.append(add_prefix(thumbnail.key))
+    kvstore.prefetch(keys)
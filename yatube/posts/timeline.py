@@ -0,0 +1,73 @@
+"""Материализованная лента подписок (fan-out on write)."""
+from django.db.models import F
+
+from .models import Follow, Post, TimelineEntry
+
+
+BATCH_SIZE = 500
+
+
+def feed(user):
+    """Посты ленты подписок: диапазон по индексу timeline_follower_date_idx."""
+    return Post.objects.for_feed().filter(
+        timeline_entries__follower=user
+    ).order_by(
+        '-timeline_entries__pub_date', F('timeline_entries__post').desc()
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                follower_id=follower_id, post=post, pub_date=post.pub_date
+            )
+            for follower_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author(follower_id, author_id):
+    """Добавляет в ленту подписчика все посты нового автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                follower_id=follower_id, post_id=post_id, pub_date=pub_date
+            )
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(follower_id, author_id):
+    TimelineEntry.objects.filter(
+        follower_id=follower_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(follower_ids=None):
+    """Пересобирает ленты целиком; возвращает число обработанных подписок."""
+    follows = Follow.objects.all()
+    entries = TimelineEntry.objects.all()
+    if follower_ids is not None:
+        follows = follows.filter(user_id__in=follower_ids)
+        entries = entries.filter(follower_id__in=follower_ids)
+    entries.delete()
+    count = 0
+    for follower_id, author_id in follows.values_list(
+        'user_id', 'author_id'
+    ).iterator():
+        add_author(follower_id, author_id)
+        count += 1
+    return count
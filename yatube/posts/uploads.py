@@ -0,0 +1,97 @@
+"""Ограничения на загрузку картинок, которые срабатывают до её разбора.
+
+BoundedUploadHandler стоит первым в FILE_UPLOAD_HANDLERS и видит файл
+по кускам, пока тот ещё читается из сокета:
+
+* файл больше POST_IMAGE_MAX_BYTES пропускается, как только счётчик
+  перевалит за лимит, — остаток запроса читается впустую, не в память;
+* по первым килобайтам Image.open читает только заголовок, и картинка
+  больше POST_IMAGE_MAX_PIXELS отбрасывается до полного декодирования.
+
+Причина отказа сохраняется в request, а PostForm показывает её как
+ошибку поля (см. errors). Полная проверка идёт потом в пуле процессов
+(images.verify_upload).
+"""
+import io
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+
+# Столько байт начала файла хватает на заголовок почти любой картинки
+HEADER_LIMIT = 256 * 1024
+ERRORS_ATTR = '_upload_errors'
+
+
+def errors(request):
+    """Ошибки загрузки по именам полей: {'image': 'Файл больше ...'}."""
+    return getattr(request, ERRORS_ATTR, {})
+
+
+def too_large_message():
+    return (f'Файл больше '
+            f'{filesizeformat(settings.POST_IMAGE_MAX_BYTES)}.')
+
+
+def too_many_pixels_message():
+    return (f'Картинка больше '
+            f'{settings.POST_IMAGE_MAX_PIXELS} пикселей.')
+
+
+def header_size(header):
+    """(ширина, высота) по началу файла или None, если данных мало."""
+    with warnings.catch_warnings():
+        # о «бомбе» судим сами по POST_IMAGE_MAX_PIXELS
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        try:
+            with Image.open(io.BytesIO(header)) as image:
+                return image.size
+        except Image.DecompressionBombError:
+            # больше собственного предела Pillow — заведомо за лимитом
+            return (float('inf'), float('inf'))
+        except Exception:
+            return None
+
+
+class BoundedUploadHandler(FileUploadHandler):
+    """Лимит размера и заголовка для каждого файла в запросе."""
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.header = b''
+        # размер части multipart браузеры обычно не присылают
+        if (self.content_length is not None
+                and self.content_length > settings.POST_IMAGE_MAX_BYTES):
+            self.reject(too_large_message())
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_BYTES:
+            self.reject(too_large_message())
+        if self.header is not None:
+            self.check_header(raw_data)
+        return raw_data
+
+    def check_header(self, raw_data):
+        self.header += raw_data
+        size = header_size(self.header)
+        if size is None:
+            if len(self.header) >= HEADER_LIMIT:
+                # заголовок не разобрать — решит полная проверка
+                self.header = None
+            return
+        self.header = None
+        width, height = size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject(too_many_pixels_message())
+
+    def reject(self, message):
+        errors = self.request.__dict__.setdefault(ERRORS_ATTR, {})
+        errors[self.field_name] = message
+        raise SkipFile(message)
+
+    def file_complete(self, file_size):
+        # файл собирают следующие обработчики
+        return None
@@ -1,84 +1,199 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, JsonResponse,
+)
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_POST
+from django.utils.functional import SimpleLazyObject
 
-from .models import Post, Group, Follow
+from .models import Post
 from .forms import PostForm, CommentForm
+from .generations import get_generation
+from .paginators import (
+    CachedCountPaginator, CursorPaginator, OldestFirstCursorPaginator,
+    count_key, decode_cursor, encode_cursor,
+)
+from .search import SearchPaginator
+from . import conditional as cond
+from . import feeds
+from . import follows
+from . import suggestions
+from . import thumbnails
+from . import uploads
 
 
 User = get_user_model()
 
 
-def paging(req, data, posts_per_page=settings.POSTS_PER_PAGE):
-    paginator = Paginator(data, posts_per_page)
-    page_number = req.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def paging(req, data, posts_per_page=settings.POSTS_PER_PAGE,
+           cache_key=None):
+    if settings.POSTS_PAGINATION == 'cursor':
+        paginator = CursorPaginator(data, posts_per_page)
+        page_obj = paginator.get_page(req.GET.get('cursor'))
+    else:
+        if cache_key is None:
+            paginator = Paginator(data, posts_per_page)
+        else:
+            paginator = CachedCountPaginator(data, posts_per_page, cache_key)
+        page_number = req.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+    # миниатюры всей страницы — одним обращением к kvstore
+    thumbnails.prefetch(page_obj)
     return page_obj
 
 
+def lazy_paging(req, data, **kwargs):
+    """page_obj, который считается только при первом обращении к нему.
+
+    Шаблон сначала проверяет фрагментный кеш по fragment_key; при
+    попадании страница не строится и COUNT с выборкой не выполняются.
+    """
+    return SimpleLazyObject(lambda: paging(req, data, **kwargs))
+
+
+def page_key(req, data, cache_key):
+    """Страница, которую покажет paging(), для ключа фрагмента.
+
+    Ключ строится по разобранному номеру или курсору, а не по строке
+    из запроса: ?page=abc, ?page=999 и битые курсоры попадают в ключ
+    той страницы, которую на самом деле получат, и не плодят записей.
+    """
+    if settings.POSTS_PAGINATION == 'cursor':
+        decoded = decode_cursor(req.GET.get('cursor'))
+        return '' if decoded is None else encode_cursor(*decoded)
+    # число постов берётся из кеша, его же потом прочитает paging()
+    paginator = CachedCountPaginator(
+        data, settings.POSTS_PER_PAGE, cache_key
+    )
+    try:
+        return paginator.validate_number(req.GET.get('page'))
+    except PageNotAnInteger:
+        return 1
+    except EmptyPage:
+        return paginator.num_pages
+
+
+def feed_page(req, data, scope, pk=None):
+    """Контекст страницы ленты с фрагментным кешем карточек.
+
+    Фрагмент живёт FEED_FRAGMENT_TIMEOUT. Поколение ленты
+    (posts.generations) хранится в записи как версия, а не в ключе:
+    после изменения ленты или FEED_FRAGMENT_SOFT_TIMEOUT фрагмент
+    пересчитывает один запрос, остальные получают прежнюю копию
+    (core.swr).
+    """
+    cache_key = count_key(scope, pk)
+    return {
+        'page_obj': lazy_paging(req, data, cache_key=cache_key),
+        'fragment_key': page_key(req, data, cache_key),
+        'fragment_version': get_generation(scope, pk),
+        'fragment_soft_timeout': settings.FEED_FRAGMENT_SOFT_TIMEOUT,
+        'fragment_timeout': settings.FEED_FRAGMENT_TIMEOUT,
+    }
+
+
+@cond.conditional(cond.index_scopes)
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.select_related()
-    context = {
-        'page_obj': paging(request, post_list),
-    }
+    post_list = Post.objects.for_feed()
+    context = feed_page(request, post_list, 'index')
     return render(request, template, context)
 
 
+@cond.conditional(cond.group_scopes)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    group = cond.get_object_or_404(request, cond.GROUPS, slug=slug)
+    posts = group.posts.for_feed()
     template = 'posts/group_list.html'
     context = {
         'group': group,
-        'page_obj': paging(request, posts),
+        **feed_page(request, posts, 'group', group.pk),
     }
     return render(request, template, context)
 
 
+@cond.conditional(cond.profile_scopes)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
+    user = cond.get_object_or_404(request, cond.AUTHORS, username=username)
+    posts = user.posts.for_feed()
     template = 'posts/profile.html'
     following = (
         request.user.is_authenticated
-        and Follow.objects.filter(user=request.user, author=user).exists()
+        and follows.is_following(request.user.pk, user.pk)
     )
     context = {
         'author': user,
-        'page_obj': paging(request, posts),
         'following': following,
+        'suggestions': suggestions.for_user(request.user, exclude=user.pk),
+        **feed_page(request, posts, 'author', user.pk),
     }
     return render(request, template, context)
 
 
+@cond.conditional(cond.post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = cond.get_object_or_404(request, cond.POSTS, id=post_id)
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
     context = {
         'post': post,
         'form': form,
-        'comments': comments,
+        'comments': comments_page(request, post),
     }
     return render(request, template, context)
 
 
+def comments_page(request, post):
+    """Порция комментариев поста по курсору из ?comments=."""
+    paginator = OldestFirstCursorPaginator(
+        post.comments.select_related('author'), settings.COMMENTS_PER_PAGE
+    )
+    return paginator.get_page(request.GET.get('comments'))
+
+
+@cond.conditional(cond.post_scopes)
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом для «Показать ещё»."""
+    post = cond.get_object_or_404(request, cond.POSTS, id=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post),
+    }
+    return render(request, 'includes/comments_page.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(
+        Post.objects.for_feed(), query, settings.POSTS_PER_PAGE
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    thumbnails.prefetch(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
+        upload_errors=uploads.errors(request),
     )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule_post(post)
         return redirect('posts:profile', username=request.user.username)
     return render(request, template, {'form': form})
 
@@ -92,10 +207,13 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        upload_errors=uploads.errors(request),
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule_post(post)
         return redirect('posts:post_detail', post.id)
     context = {
         "form": form,
@@ -107,21 +225,62 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    """Добавляет комментарий; fetch/XHR получает только его фрагмент.
+
+    Пост не загружается: комментарий ссылается на него по id, а сигнал
+    comment_saved сдвигает поколение только этого поста.
+    """
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('No Post matches the given query.')
     form = CommentForm(request.POST or None)
+    asynchronous = request.is_ajax() or wants_json(request)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
-        comment.post = post
+        comment.post_id = post_id
         comment.save()
+        if asynchronous:
+            return comment_response(request, comment)
+    elif asynchronous:
+        return comment_errors(request, form)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def wants_json(request):
+    return 'application/json' in request.META.get('HTTP_ACCEPT', '')
+
+
+def comment_response(request, comment):
+    html = render_to_string(
+        'includes/comment.html', {'comment': comment}, request
+    )
+    if not wants_json(request):
+        return HttpResponse(html)
+    return JsonResponse({
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'pub_date': comment.pub_date.isoformat(),
+        'html': html,
+    }, status=201)
+
+
+def comment_errors(request, form):
+    if wants_json(request):
+        return JsonResponse({'errors': form.errors}, status=400)
+    return HttpResponseBadRequest(form.errors.as_ul())
+
+
 @login_required
+@cond.conditional(cond.follow_scopes)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = feeds.follow_feed(request.user)
     context = {
-        'page_obj': paging(request, post_list),
+        'page_obj': paging(
+            request, post_list,
+            cache_key=count_key('follower', request.user.pk),
+        ),
+        'suggestions': suggestions.for_user(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -129,13 +288,42 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     user = get_object_or_404(User, username=username)
-    if request.user != user:
-        Follow.objects.get_or_create(user=request.user, author=user)
-    return redirect('posts:follow_index')
+    follows.follow(request.user, user)
+    return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     user = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=user).delete()
-    return redirect('posts:follow_index')
+    follows.unfollow(request.user, user)
+    return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def follow_toggle(request, username):
+    """Ставит подписку в состояние из POST['follow'] ('1' или '0').
+
+    Повтор запроса ничего не меняет. fetch/XHR получает кнопку с новым
+    состоянием и числом подписчиков (или JSON), форма без JS —
+    редирект обратно в профиль.
+    """
+    author = get_object_or_404(User, username=username)
+    following = request.POST.get('follow') == '1'
+    if following:
+        follows.follow(request.user, author)
+    else:
+        follows.unfollow(request.user, author)
+    if not (request.is_ajax() or wants_json(request)):
+        return redirect('posts:profile', username=username)
+    context = {
+        'author': author,
+        'following': following and author != request.user,
+        'followers_count': follows.followers_count(author),
+    }
+    if wants_json(request):
+        return JsonResponse({
+            'following': context['following'],
+            'followers_count': context['followers_count'],
+        })
+    return render(request, 'posts/includes/follow_button.html', context)
@@ -149,13 +149,72 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
+# Комментарии под постом показываются порциями (см. posts.views)
+COMMENTS_PER_PAGE = 20
 POSTS_ON_SECOND_PAGE = 3
+# 'pages' — нумерованные страницы, 'cursor' — keyset-пагинация
+POSTS_PAGINATION = 'pages'
+# Лента подписок: 'join', 'timeline' или 'merge' (см. posts.feeds).
+# После возврата к 'timeline' выполните manage.py rebuild_timelines.
+FOLLOW_FEED_STRATEGY = 'timeline'
+# Сколько свежих постов автора держать в кеше для стратегии 'merge'
+FEED_AUTHOR_CACHE_SIZE = 100
+FEED_AUTHOR_CACHE_TIMEOUT = 60 * 60
+# Список подписок пользователя (posts.follows) версионирован поколением
+FOLLOWING_CACHE_TIMEOUT = 60 * 60 * 24
+# Длиннее этого лента 'join' идёт соединением, а не IN по списку
+FOLLOWING_IN_LIMIT = 500
+# «Кого почитать» (posts.suggestions): сколько хранить и показывать,
+# вес общих подписок и порог «слишком популярного» автора
+SUGGESTIONS_COUNT = 20
+SUGGESTIONS_SHOWN = 5
+SUGGESTIONS_COFOLLOW_WEIGHT = 0.5
+SUGGESTIONS_MAX_FOLLOWERS = 1000
+# Сколько живёт закешированное число постов ленты (см. posts.paginators)
+FEED_COUNT_CACHE_TIMEOUT = 60 * 60
+# Фрагменты лент версионируются поколениями (posts.generations),
+# поэтому могут жить долго
+FEED_FRAGMENT_TIMEOUT = 60 * 60 * 6
+# После мягкого TTL фрагмент пересчитывает один запрос (см. core.swr)
+FEED_FRAGMENT_SOFT_TIMEOUT = 60
+# Поиск ранжирует по bm25 окнами по столько совпадений (posts.search)
+SEARCH_RANK_WINDOW = 1000
+# Миниатюры создаются в фоновом пуле (posts.thumbnails); 0 — в запросе
+THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+# kvstore с пакетной загрузкой на страницу и LRU в памяти процесса
+THUMBNAIL_KVSTORE = 'posts.thumbnails.BatchedKVStore'
+THUMBNAIL_LRU_SIZE = 10000
+# Варианты картинки поста для srcset: кроп с пропорциями POST_IMAGE_SIZE
+# каждой ширины в каждом формате. Готовятся сразу после загрузки;
+# WebP пропускается, если Pillow собран без него.
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = [480, 960, 1440]
+POST_IMAGE_FORMATS = ['WEBP', 'JPEG']
+POST_IMAGE_QUALITY = 80
+# Лимиты загрузки проверяются по ходу чтения запроса (posts.uploads),
+# полное декодирование — в пуле процессов (posts.images.verify_upload)
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.BoundedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_VALIDATION_WORKERS = 2
+IMAGE_VALIDATION_TIMEOUT = 10
 POST_LENGTH = 15
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # Один кеш на все воркеры, см. core.cache_backend
+        'BACKEND': 'core.cache_backend.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        # по записи на автора для FOLLOW_FEED_STRATEGY = 'merge'
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
+# Тесты берут тот же бэкенд с временным файлом, см. core.testing
+TEST_RUNNER = 'core.testing.TestRunner'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'